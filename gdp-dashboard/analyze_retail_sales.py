@@ -4,7 +4,9 @@ Enhanced Analysis of retail_sales table in assignment_one_1 dataset
 Creates comprehensive views, stored procedures, and provides frontend insights
 """
 
+import json
 import pandas as pd
+from google.api_core.exceptions import NotFound
 from google.cloud import bigquery
 from google.oauth2 import service_account
 import streamlit as st
@@ -13,95 +15,315 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import numpy as np
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+# Meteorological seasons by calendar month
+SEASON_MAP = {
+    12: 'Winter', 1: 'Winter', 2: 'Winter',
+    3: 'Spring', 4: 'Spring', 5: 'Spring',
+    6: 'Summer', 7: 'Summer', 8: 'Summer',
+    9: 'Fall', 10: 'Fall', 11: 'Fall',
+}
+
+@st.cache_resource
+def get_bigquery_client():
+    """Create the BigQuery client once per process from the local service account file"""
+    credentials = service_account.Credentials.from_service_account_file(
+        "istanbul_sales_analysis/API.JSON",
+        scopes=["https://www.googleapis.com/auth/cloud-platform"]
+    )
+    
+    return bigquery.Client(
+        credentials=credentials,
+        project=credentials.project_id
+    )
+
+# The analysis views read by display_frontend_insights
+INSIGHT_VIEWS = (
+    "retail_sales_executive_summary",
+    "retail_sales_performance_insights",
+    "retail_sales_store_insights",
+    "retail_sales_customer_segmentation",
+    "retail_sales_product_insights",
+    "retail_sales_temporal_insights",
+    "retail_sales_payment_insights",
+    "retail_sales_data_quality",
+    "retail_sales_kpi_insights",
+)
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _fetch_insight_views(project_id, dataset_id):
+    """Read every analysis view in one query, cached per project and dataset for an hour"""
+    # The client is unhashable, so fetch it from its own resource cache here
+    # rather than passing it in as a cache key
+    client = get_bigquery_client()
+    
+    # The views have different columns, so each row travels as a JSON string
+    # tagged with its view and the nine small results come back from a single
+    # job instead of nine
+    union_query = "\nUNION ALL\n".join(
+        f"SELECT '{view}' as tag, TO_JSON_STRING(t) as row FROM `{project_id}.{dataset_id}.{view}` t"
+        for view in INSIGHT_VIEWS
+    )
+    # Results larger than the first page stream through the BigQuery Storage
+    # Read API as Arrow instead of being paged over REST as JSON rows
+    df = client.query(union_query).to_dataframe(create_bqstorage_client=True)
+    
+    # The views' own ORDER BY doesn't survive the UNION ALL, so each section
+    # sorts its frame again before charting
+    by_tag = {
+        tag: pd.json_normalize(group['row'].map(json.loads).tolist())
+        for tag, group in df.groupby('tag')
+    }
+    return {view: by_tag.get(view, pd.DataFrame()) for view in INSIGHT_VIEWS}
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _fetch_query_df(sql, params=()):
+    """Run an ad-hoc query, cached on its SQL text and parameters for an hour"""
+    client = get_bigquery_client()
+    # Parameters arrive as (name, type, value) tuples so they stay hashable
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ScalarQueryParameter(*param) for param in params]
+    )
+    return client.query(sql, job_config=job_config).to_dataframe(create_bqstorage_client=True)
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _fetch_query_dfs(queries, params=()):
+    """Run a batch of independent queries side by side, cached on their SQL and parameters for an hour"""
+    client = get_bigquery_client()
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ScalarQueryParameter(*param) for param in params]
+    )
+    
+    # The worker threads only talk to BigQuery; they have no Streamlit script
+    # context, so the caching stays out here around the whole batch
+    def run(sql):
+        return client.query(sql, job_config=job_config).to_dataframe(create_bqstorage_client=True)
+    
+    with ThreadPoolExecutor(max_workers=len(queries)) as executor:
+        futures = {name: executor.submit(run, sql) for name, sql in queries.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+def _typed_table_is_stale(client, table_ref, typed_ref):
+    """Check whether retail_sales_typed is missing or older than retail_sales"""
+    try:
+        typed_table = client.get_table(typed_ref)
+    except NotFound:
+        return True
+    
+    return typed_table.modified < client.get_table(table_ref).modified
 
 def create_analysis_views_and_procedures(client, project_id, dataset_id):
     """Create comprehensive business intelligence views for data insights"""
     
     st.subheader("🏗️ Creating Business Intelligence Views")
     
-    # Define the table reference
+    # Define the table references
     table_ref = f"{project_id}.{dataset_id}.retail_sales"
+    typed_ref = f"{project_id}.{dataset_id}.retail_sales_typed"
+    
+    # Typed staging copy of retail_sales that every view reads. Amount,
+    # quantity and date are cast once here instead of in every aggregate of
+    # every view, the views only touch the columns they need, and the native
+    # types give BigQuery usable min/max block statistics for pruning. It is
+    # only rebuilt when retail_sales has changed since the last build
+    rebuild_typed = _typed_table_is_stale(client, table_ref, typed_ref)
+    typed_table_query = f"""
+    CREATE OR REPLACE TABLE `{typed_ref}`
+    PARTITION BY DATE_TRUNC(transaction_date, MONTH)
+    CLUSTER BY product_category, store_name
+    AS
+    SELECT 
+        customer_id,
+        store_name,
+        product_category,
+        product_name,
+        payment_method,
+        SAFE_CAST(transaction_date AS DATE) as transaction_date,
+        SAFE_CAST(total_amount AS FLOAT64) as amt,
+        SAFE_CAST(quantity AS INT64) as qty
+    FROM `{table_ref}`
+    """
+    
+    # Materialized views hold the raw per-group aggregates and BigQuery keeps
+    # them up to date from the typed table, so reading a view no longer
+    # re-aggregates every sale. Materialized views can't hold COUNT(DISTINCT),
+    # window functions, subqueries or expressions over aggregates, so distinct
+    # counts are stored as HLL sketches and the ratios, percentages and
+    # segments are computed by the thin regular views further down.
+    # They are replaced on every build, so an edited definition always takes
+    # effect and they never outlive a rebuilt typed table
+    mv_options = "OPTIONS(enable_refresh = true, refresh_interval_minutes = 60, max_staleness = INTERVAL 1 HOUR)"
+    
+    category_mv_query = f"""
+    CREATE OR REPLACE MATERIALIZED VIEW `{project_id}.{dataset_id}.mv_retail_sales_by_category`
+    {mv_options}
+    AS
+    SELECT 
+        product_category,
+        COUNT(*) as transaction_count,
+        COUNT(amt) as amount_count,
+        SUM(amt) as revenue,
+        COUNT(qty) as quantity_count,
+        SUM(qty) as quantity,
+        COUNTIF(transaction_date IS NOT NULL) as records_with_date,
+        COUNTIF(product_name IS NOT NULL) as records_with_product,
+        COUNTIF(store_name IS NOT NULL) as records_with_store,
+        COUNTIF(customer_id IS NOT NULL) as records_with_customer,
+        HLL_COUNT.INIT(customer_id) as customer_sketch,
+        HLL_COUNT.INIT(store_name) as store_sketch
+    FROM `{typed_ref}`
+    GROUP BY product_category
+    """
+    
+    store_mv_query = f"""
+    CREATE OR REPLACE MATERIALIZED VIEW `{project_id}.{dataset_id}.mv_retail_sales_by_store`
+    {mv_options}
+    AS
+    SELECT 
+        store_name,
+        COUNT(*) as transaction_count,
+        COUNT(amt) as amount_count,
+        SUM(amt) as revenue,
+        SUM(qty) as quantity,
+        HLL_COUNT.INIT(customer_id) as customer_sketch,
+        HLL_COUNT.INIT(product_category) as category_sketch
+    FROM `{typed_ref}`
+    WHERE store_name IS NOT NULL
+    GROUP BY store_name
+    """
+    
+    customer_mv_query = f"""
+    CREATE OR REPLACE MATERIALIZED VIEW `{project_id}.{dataset_id}.mv_retail_sales_by_customer`
+    {mv_options}
+    AS
+    SELECT 
+        customer_id,
+        COUNT(*) as transaction_count,
+        SUM(amt) as revenue,
+        HLL_COUNT.INIT(store_name) as store_sketch,
+        HLL_COUNT.INIT(product_category) as category_sketch
+    FROM `{typed_ref}`
+    WHERE customer_id IS NOT NULL
+    GROUP BY customer_id
+    """
+    
+    product_mv_query = f"""
+    CREATE OR REPLACE MATERIALIZED VIEW `{project_id}.{dataset_id}.mv_retail_sales_by_product`
+    {mv_options}
+    AS
+    SELECT 
+        product_name,
+        product_category,
+        COUNT(*) as transaction_count,
+        COUNT(amt) as amount_count,
+        SUM(amt) as revenue,
+        SUM(qty) as quantity,
+        HLL_COUNT.INIT(customer_id) as customer_sketch,
+        HLL_COUNT.INIT(store_name) as store_sketch
+    FROM `{typed_ref}`
+    WHERE product_name IS NOT NULL
+    GROUP BY product_name, product_category
+    """
+    
+    temporal_mv_query = f"""
+    CREATE OR REPLACE MATERIALIZED VIEW `{project_id}.{dataset_id}.mv_retail_sales_by_day`
+    {mv_options}
+    AS
+    SELECT 
+        transaction_date as sale_date,
+        COUNT(*) as transaction_count,
+        COUNT(amt) as amount_count,
+        SUM(amt) as revenue,
+        HLL_COUNT.INIT(customer_id) as customer_sketch,
+        HLL_COUNT.INIT(store_name) as store_sketch
+    FROM `{typed_ref}`
+    WHERE transaction_date IS NOT NULL
+    GROUP BY sale_date
+    """
+    
+    payment_mv_query = f"""
+    CREATE OR REPLACE MATERIALIZED VIEW `{project_id}.{dataset_id}.mv_retail_sales_by_payment`
+    {mv_options}
+    AS
+    SELECT 
+        payment_method,
+        COUNT(*) as transaction_count,
+        COUNT(amt) as amount_count,
+        SUM(amt) as revenue,
+        HLL_COUNT.INIT(customer_id) as customer_sketch,
+        HLL_COUNT.INIT(store_name) as store_sketch
+    FROM `{typed_ref}`
+    WHERE payment_method IS NOT NULL
+    GROUP BY payment_method
+    """
+    
+    materialized_views = [
+        category_mv_query,
+        store_mv_query,
+        customer_mv_query,
+        product_mv_query,
+        temporal_mv_query,
+        payment_mv_query,
+    ]
+    
+    category_mv = f"{project_id}.{dataset_id}.mv_retail_sales_by_category"
     
     # 1. Executive Summary Dashboard View
-    st.write("**1️⃣ Executive Summary Dashboard**")
     executive_summary_query = f"""
     CREATE OR REPLACE VIEW `{project_id}.{dataset_id}.retail_sales_executive_summary` AS
     SELECT 
         'Executive Summary' as dashboard_type,
-        COUNT(*) as total_transactions,
-        COUNT(DISTINCT customer_id) as unique_customers,
-        COUNT(DISTINCT store_name) as total_stores,
-        COUNT(DISTINCT product_category) as product_categories,
-        SUM(CAST(total_amount AS FLOAT64)) as total_revenue,
-        AVG(CAST(total_amount AS FLOAT64)) as avg_transaction_value,
-        SUM(CAST(quantity AS INT64)) as total_items_sold,
-        AVG(CAST(quantity AS FLOAT64)) as avg_items_per_transaction,
-        ROUND(SUM(CAST(total_amount AS FLOAT64)) / COUNT(DISTINCT customer_id), 2) as revenue_per_customer,
-        ROUND(SUM(CAST(total_amount AS FLOAT64)) / COUNT(DISTINCT store_name), 2) as revenue_per_store
-    FROM `{table_ref}`
+        SUM(transaction_count) as total_transactions,
+        HLL_COUNT.MERGE(customer_sketch) as unique_customers,
+        HLL_COUNT.MERGE(store_sketch) as total_stores,
+        COUNT(product_category) as product_categories,
+        SUM(revenue) as total_revenue,
+        SAFE_DIVIDE(SUM(revenue), SUM(amount_count)) as avg_transaction_value,
+        SUM(quantity) as total_items_sold,
+        SAFE_DIVIDE(SUM(quantity), SUM(quantity_count)) as avg_items_per_transaction,
+        ROUND(SUM(revenue) / HLL_COUNT.MERGE(customer_sketch), 2) as revenue_per_customer,
+        ROUND(SUM(revenue) / HLL_COUNT.MERGE(store_sketch), 2) as revenue_per_store
+    FROM `{category_mv}`
     """
     
-    try:
-        client.query(executive_summary_query)
-        st.success("✅ Created Executive Summary Dashboard")
-    except Exception as e:
-        st.error(f"❌ Error creating Executive Summary: {e}")
-    
     # 2. Sales Performance Insights View
-    st.write("**2️⃣ Sales Performance Insights**")
     sales_insights_query = f"""
     CREATE OR REPLACE VIEW `{project_id}.{dataset_id}.retail_sales_performance_insights` AS
     SELECT 
         product_category,
-        COUNT(*) as transaction_count,
-        SUM(CAST(total_amount AS FLOAT64)) as total_revenue,
-        AVG(CAST(total_amount AS FLOAT64)) as avg_transaction_value,
-        SUM(CAST(quantity AS INT64)) as total_quantity_sold,
-        COUNT(DISTINCT customer_id) as unique_customers,
-        COUNT(DISTINCT store_name) as stores_involved,
-        ROUND(SUM(CAST(total_amount AS FLOAT64)) * 100.0 / SUM(SUM(CAST(total_amount AS FLOAT64))) OVER(), 2) as revenue_percentage,
-        ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER(), 2) as transaction_percentage
-    FROM `{table_ref}`
+        transaction_count,
+        revenue as total_revenue,
+        SAFE_DIVIDE(revenue, amount_count) as avg_transaction_value,
+        quantity as total_quantity_sold,
+        HLL_COUNT.EXTRACT(customer_sketch) as unique_customers,
+        HLL_COUNT.EXTRACT(store_sketch) as stores_involved,
+        ROUND(revenue * 100.0 / SUM(revenue) OVER(), 2) as revenue_percentage,
+        ROUND(transaction_count * 100.0 / SUM(transaction_count) OVER(), 2) as transaction_percentage
+    FROM `{category_mv}`
     WHERE product_category IS NOT NULL
-    GROUP BY product_category
     ORDER BY total_revenue DESC
     """
     
-    try:
-        client.query(sales_insights_query)
-        st.success("✅ Created Sales Performance Insights")
-    except Exception as e:
-        st.error(f"❌ Error creating Sales Insights: {e}")
-    
     # 3. Store Performance Analysis View
-    st.write("**3️⃣ Store Performance Analysis**")
     store_insights_query = f"""
     CREATE OR REPLACE VIEW `{project_id}.{dataset_id}.retail_sales_store_insights` AS
     SELECT 
         store_name,
-        COUNT(*) as transaction_count,
-        SUM(CAST(total_amount AS FLOAT64)) as total_revenue,
-        AVG(CAST(total_amount AS FLOAT64)) as avg_transaction_value,
-        COUNT(DISTINCT customer_id) as unique_customers,
-        COUNT(DISTINCT product_category) as product_categories,
-        SUM(CAST(quantity AS INT64)) as total_quantity_sold,
-        ROUND(SUM(CAST(total_amount AS FLOAT64)) / COUNT(DISTINCT customer_id), 2) as revenue_per_customer,
-        ROUND(COUNT(*) / COUNT(DISTINCT customer_id), 2) as transactions_per_customer,
-        ROUND(SUM(CAST(total_amount AS FLOAT64)) / COUNT(*), 2) as revenue_per_transaction
-    FROM `{table_ref}`
-    WHERE store_name IS NOT NULL
-    GROUP BY store_name
+        transaction_count,
+        revenue as total_revenue,
+        SAFE_DIVIDE(revenue, amount_count) as avg_transaction_value,
+        HLL_COUNT.EXTRACT(customer_sketch) as unique_customers,
+        HLL_COUNT.EXTRACT(category_sketch) as product_categories,
+        quantity as total_quantity_sold,
+        ROUND(revenue / HLL_COUNT.EXTRACT(customer_sketch), 2) as revenue_per_customer,
+        ROUND(transaction_count / HLL_COUNT.EXTRACT(customer_sketch), 2) as transactions_per_customer,
+        ROUND(revenue / transaction_count, 2) as revenue_per_transaction
+    FROM `{project_id}.{dataset_id}.mv_retail_sales_by_store`
     ORDER BY total_revenue DESC
     """
     
-    try:
-        client.query(store_insights_query)
-        st.success("✅ Created Store Performance Insights")
-    except Exception as e:
-        st.error(f"❌ Error creating Store Insights: {e}")
-    
     # 4. Customer Segmentation View
-    st.write("**4️⃣ Customer Segmentation Analysis**")
     customer_segmentation_query = f"""
     CREATE OR REPLACE VIEW `{project_id}.{dataset_id}.retail_sales_customer_segmentation` AS
     SELECT 
@@ -120,164 +342,163 @@ def create_analysis_views_and_procedures(client, project_id, dataset_id):
     FROM (
         SELECT 
             customer_id,
-            COUNT(*) as transaction_count,
-            SUM(CAST(total_amount AS FLOAT64)) as total_spent,
-            COUNT(DISTINCT store_name) as stores_visited,
-            COUNT(DISTINCT product_category) as product_categories_purchased
-        FROM `{table_ref}`
-        WHERE customer_id IS NOT NULL
-        GROUP BY customer_id
+            transaction_count,
+            revenue as total_spent,
+            HLL_COUNT.EXTRACT(store_sketch) as stores_visited,
+            HLL_COUNT.EXTRACT(category_sketch) as product_categories_purchased
+        FROM `{project_id}.{dataset_id}.mv_retail_sales_by_customer`
     )
     GROUP BY customer_segment
     ORDER BY avg_spending DESC
     """
     
-    try:
-        client.query(customer_segmentation_query)
-        st.success("✅ Created Customer Segmentation")
-    except Exception as e:
-        st.error(f"❌ Error creating Customer Segmentation: {e}")
-    
     # 5. Product Performance Insights View
-    st.write("**5️⃣ Product Performance Insights**")
     product_insights_query = f"""
     CREATE OR REPLACE VIEW `{project_id}.{dataset_id}.retail_sales_product_insights` AS
     SELECT 
         product_name,
         product_category,
-        COUNT(*) as times_purchased,
-        SUM(CAST(quantity AS INT64)) as total_quantity_sold,
-        SUM(CAST(total_amount AS FLOAT64)) as total_revenue,
-        AVG(CAST(total_amount AS FLOAT64)) as avg_sale_price,
-        COUNT(DISTINCT customer_id) as unique_customers,
-        COUNT(DISTINCT store_name) as stores_selling,
-        ROUND(SUM(CAST(total_amount AS FLOAT64)) / SUM(CAST(quantity AS INT64)), 2) as effective_unit_price,
-        ROUND(COUNT(DISTINCT customer_id) * 100.0 / COUNT(*), 2) as customer_diversity_score
-    FROM `{table_ref}`
-    WHERE product_name IS NOT NULL
-    GROUP BY product_name, product_category
+        transaction_count as times_purchased,
+        quantity as total_quantity_sold,
+        revenue as total_revenue,
+        SAFE_DIVIDE(revenue, amount_count) as avg_sale_price,
+        HLL_COUNT.EXTRACT(customer_sketch) as unique_customers,
+        HLL_COUNT.EXTRACT(store_sketch) as stores_selling,
+        ROUND(revenue / quantity, 2) as effective_unit_price,
+        ROUND(HLL_COUNT.EXTRACT(customer_sketch) * 100.0 / transaction_count, 2) as customer_diversity_score
+    FROM `{project_id}.{dataset_id}.mv_retail_sales_by_product`
     ORDER BY total_revenue DESC
     """
     
-    try:
-        client.query(product_insights_query)
-        st.success("✅ Created Product Performance Insights")
-    except Exception as e:
-        st.error(f"❌ Error creating Product Insights: {e}")
-    
     # 6. Temporal Trends & Seasonality View
-    st.write("**6️⃣ Temporal Trends & Seasonality**")
     temporal_insights_query = f"""
     CREATE OR REPLACE VIEW `{project_id}.{dataset_id}.retail_sales_temporal_insights` AS
     SELECT 
-        EXTRACT(YEAR FROM transaction_date) as year,
-        EXTRACT(MONTH FROM transaction_date) as month,
-        EXTRACT(DAYOFWEEK FROM transaction_date) as day_of_week,
-        CASE EXTRACT(MONTH FROM transaction_date)
-            WHEN 12 OR 1 OR 2 THEN 'Winter'
-            WHEN 3 OR 4 OR 5 THEN 'Spring'
-            WHEN 6 OR 7 OR 8 THEN 'Summer'
-            WHEN 9 OR 10 OR 11 THEN 'Fall'
-        END as season,
-        COUNT(*) as transaction_count,
-        SUM(CAST(total_amount AS FLOAT64)) as monthly_revenue,
-        AVG(CAST(total_amount AS FLOAT64)) as avg_transaction_value,
-        COUNT(DISTINCT customer_id) as unique_customers,
-        COUNT(DISTINCT store_name) as active_stores,
-        ROUND(SUM(CAST(total_amount AS FLOAT64)) / COUNT(DISTINCT customer_id), 2) as revenue_per_customer
-    FROM `{table_ref}`
-    WHERE transaction_date IS NOT NULL
-    GROUP BY year, month, day_of_week, season
-    ORDER BY year, month, day_of_week
+        sale_date,
+        transaction_count,
+        revenue as daily_revenue,
+        SAFE_DIVIDE(revenue, amount_count) as avg_transaction_value,
+        HLL_COUNT.EXTRACT(customer_sketch) as unique_customers,
+        HLL_COUNT.EXTRACT(store_sketch) as active_stores
+    FROM `{project_id}.{dataset_id}.mv_retail_sales_by_day`
+    ORDER BY sale_date
     """
     
-    try:
-        client.query(temporal_insights_query)
-        st.success("✅ Created Temporal Trends & Seasonality")
-    except Exception as e:
-        st.error(f"❌ Error creating Temporal Insights: {e}")
-    
     # 7. Payment & Financial Insights View
-    st.write("**7️⃣ Payment & Financial Insights**")
     payment_insights_query = f"""
     CREATE OR REPLACE VIEW `{project_id}.{dataset_id}.retail_sales_payment_insights` AS
     SELECT 
         payment_method,
-        COUNT(*) as transaction_count,
-        SUM(CAST(total_amount AS FLOAT64)) as total_revenue,
-        AVG(CAST(total_amount AS FLOAT64)) as avg_transaction_value,
-        COUNT(DISTINCT customer_id) as unique_customers,
-        COUNT(DISTINCT store_name) as stores_used,
-        ROUND(SUM(CAST(total_amount AS FLOAT64)) * 100.0 / SUM(SUM(CAST(total_amount AS FLOAT64))) OVER(), 2) as revenue_percentage,
-        ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER(), 2) as transaction_percentage,
-        ROUND(SUM(CAST(total_amount AS FLOAT64)) / COUNT(DISTINCT customer_id), 2) as revenue_per_customer
-    FROM `{table_ref}`
-    WHERE payment_method IS NOT NULL
-    GROUP BY payment_method
+        transaction_count,
+        revenue as total_revenue,
+        SAFE_DIVIDE(revenue, amount_count) as avg_transaction_value,
+        HLL_COUNT.EXTRACT(customer_sketch) as unique_customers,
+        HLL_COUNT.EXTRACT(store_sketch) as stores_used,
+        ROUND(revenue * 100.0 / SUM(revenue) OVER(), 2) as revenue_percentage,
+        ROUND(transaction_count * 100.0 / SUM(transaction_count) OVER(), 2) as transaction_percentage,
+        ROUND(revenue / HLL_COUNT.EXTRACT(customer_sketch), 2) as revenue_per_customer
+    FROM `{project_id}.{dataset_id}.mv_retail_sales_by_payment`
     ORDER BY total_revenue DESC
     """
     
-    try:
-        client.query(payment_insights_query)
-        st.success("✅ Created Payment & Financial Insights")
-    except Exception as e:
-        st.error(f"❌ Error creating Payment Insights: {e}")
-    
     # 8. Data Quality & Completeness View
-    st.write("**8️⃣ Data Quality & Completeness**")
     data_quality_query = f"""
     CREATE OR REPLACE VIEW `{project_id}.{dataset_id}.retail_sales_data_quality` AS
     SELECT 
         'Data Completeness Assessment' as metric_type,
-        COUNT(*) as total_records,
-        COUNTIF(transaction_date IS NOT NULL) as records_with_date,
-        COUNTIF(product_name IS NOT NULL) as records_with_product,
-        COUNTIF(store_name IS NOT NULL) as records_with_store,
-        COUNTIF(customer_id IS NOT NULL) as records_with_customer,
-        COUNTIF(quantity IS NOT NULL) as records_with_quantity,
-        COUNTIF(total_amount IS NOT NULL) as records_with_amount,
-        ROUND(COUNTIF(transaction_date IS NOT NULL) * 100.0 / COUNT(*), 2) as date_completeness_pct,
-        ROUND(COUNTIF(product_name IS NOT NULL) * 100.0 / COUNT(*), 2) as product_completeness_pct,
-        ROUND(COUNTIF(store_name IS NOT NULL) * 100.0 / COUNT(*), 2) as store_completeness_pct,
-        ROUND(COUNTIF(customer_id IS NOT NULL) * 100.0 / COUNT(*), 2) as customer_completeness_pct,
-        ROUND(COUNTIF(quantity IS NOT NULL) * 100.0 / COUNT(*), 2) as quantity_completeness_pct,
-        ROUND(COUNTIF(total_amount IS NOT NULL) * 100.0 / COUNT(*), 2) as amount_completeness_pct
-    FROM `{table_ref}`
+        SUM(transaction_count) as total_records,
+        SUM(records_with_date) as records_with_date,
+        SUM(records_with_product) as records_with_product,
+        SUM(records_with_store) as records_with_store,
+        SUM(records_with_customer) as records_with_customer,
+        SUM(quantity_count) as records_with_quantity,
+        SUM(amount_count) as records_with_amount,
+        ROUND(SUM(records_with_date) * 100.0 / SUM(transaction_count), 2) as date_completeness_pct,
+        ROUND(SUM(records_with_product) * 100.0 / SUM(transaction_count), 2) as product_completeness_pct,
+        ROUND(SUM(records_with_store) * 100.0 / SUM(transaction_count), 2) as store_completeness_pct,
+        ROUND(SUM(records_with_customer) * 100.0 / SUM(transaction_count), 2) as customer_completeness_pct,
+        ROUND(SUM(quantity_count) * 100.0 / SUM(transaction_count), 2) as quantity_completeness_pct,
+        ROUND(SUM(amount_count) * 100.0 / SUM(transaction_count), 2) as amount_completeness_pct
+    FROM `{category_mv}`
     """
     
-    try:
-        client.query(data_quality_query)
-        st.success("✅ Created Data Quality Assessment")
-    except Exception as e:
-        st.error(f"❌ Error creating Data Quality: {e}")
-    
     # 9. Business Intelligence KPIs View
-    st.write("**9️⃣ Business Intelligence KPIs**")
     kpi_insights_query = f"""
     CREATE OR REPLACE VIEW `{project_id}.{dataset_id}.retail_sales_kpi_insights` AS
     SELECT 
         'Key Performance Indicators' as kpi_type,
-        COUNT(*) as total_transactions,
-        COUNT(DISTINCT customer_id) as unique_customers,
-        COUNT(DISTINCT store_name) as total_stores,
-        SUM(CAST(total_amount AS FLOAT64)) as total_revenue,
-        AVG(CAST(total_amount AS FLOAT64)) as avg_transaction_value,
-        SUM(CAST(quantity AS INT64)) as total_items_sold,
-        ROUND(SUM(CAST(total_amount AS FLOAT64)) / COUNT(DISTINCT customer_id), 2) as customer_lifetime_value,
-        ROUND(SUM(CAST(total_amount AS FLOAT64)) / COUNT(DISTINCT store_name), 2) as store_performance,
-        ROUND(COUNT(*) / COUNT(DISTINCT customer_id), 2) as customer_engagement_rate,
-        ROUND(SUM(CAST(total_amount AS FLOAT64)) / COUNT(*), 2) as revenue_per_transaction,
-        ROUND(SUM(CAST(quantity AS INT64)) / COUNT(*), 2) as items_per_transaction
-    FROM `{table_ref}`
+        SUM(transaction_count) as total_transactions,
+        HLL_COUNT.MERGE(customer_sketch) as unique_customers,
+        HLL_COUNT.MERGE(store_sketch) as total_stores,
+        SUM(revenue) as total_revenue,
+        SAFE_DIVIDE(SUM(revenue), SUM(amount_count)) as avg_transaction_value,
+        SUM(quantity) as total_items_sold,
+        ROUND(SUM(revenue) / HLL_COUNT.MERGE(customer_sketch), 2) as customer_lifetime_value,
+        ROUND(SUM(revenue) / HLL_COUNT.MERGE(store_sketch), 2) as store_performance,
+        ROUND(SUM(transaction_count) / HLL_COUNT.MERGE(customer_sketch), 2) as customer_engagement_rate,
+        ROUND(SUM(revenue) / SUM(transaction_count), 2) as revenue_per_transaction,
+        ROUND(SUM(quantity) / SUM(transaction_count), 2) as items_per_transaction
+    FROM `{category_mv}`
     """
     
+    analysis_views = [
+        ("1️⃣", "Executive Summary Dashboard", "retail_sales_executive_summary", executive_summary_query),
+        ("2️⃣", "Sales Performance Insights", "retail_sales_performance_insights", sales_insights_query),
+        ("3️⃣", "Store Performance Analysis", "retail_sales_store_insights", store_insights_query),
+        ("4️⃣", "Customer Segmentation Analysis", "retail_sales_customer_segmentation", customer_segmentation_query),
+        ("5️⃣", "Product Performance Insights", "retail_sales_product_insights", product_insights_query),
+        ("6️⃣", "Temporal Trends & Seasonality", "retail_sales_temporal_insights", temporal_insights_query),
+        ("7️⃣", "Payment & Financial Insights", "retail_sales_payment_insights", payment_insights_query),
+        ("8️⃣", "Data Quality & Completeness", "retail_sales_data_quality", data_quality_query),
+        ("9️⃣", "Business Intelligence KPIs", "retail_sales_kpi_insights", kpi_insights_query),
+    ]
+    
+    # Build the typed table, the materialized views and all nine views in one
+    # script job. The exception handler turns a failing statement into a
+    # result row, so the statements that already ran are still reported
+    statements = (
+        ([typed_table_query] if rebuild_typed else [])
+        + materialized_views
+        + [query for _, _, _, query in analysis_views]
+    )
+    script = (
+        "BEGIN\n"
+        + ";\n".join(statements)
+        + ";\nEXCEPTION WHEN ERROR THEN\n    SELECT @@error.message as error_message;\nEND"
+    )
+    
     try:
-        client.query(kpi_insights_query)
-        st.success("✅ Created Business Intelligence KPIs")
+        with st.spinner("Building the typed table and views..."):
+            script_job = client.query(
+                script,
+                job_config=bigquery.QueryJobConfig(priority=bigquery.QueryPriority.INTERACTIVE)
+            )
+            errors = [row.error_message for row in script_job.result()]
+            
+            # Every statement of the script runs as a child job, so their DDL
+            # targets tell which views were actually created
+            created_views = {
+                child.ddl_target_table.table_id
+                for child in client.list_jobs(parent_job=script_job)
+                if child.error_result is None and child.ddl_target_table is not None
+            }
+        
+        for number, name, view_id, _ in analysis_views:
+            st.write(f"**{number} {name}**")
+            if view_id in created_views:
+                st.success(f"✅ Created {name}")
+            else:
+                st.error(f"❌ Error creating {name}")
+        
+        if errors:
+            st.error(f"❌ Error creating Business Intelligence views: {errors[0]}")
+        else:
+            st.success("🎉 All Business Intelligence views created successfully!")
+        
+        # The views were just rebuilt, so drop any results cached from before
+        _fetch_insight_views.clear()
     except Exception as e:
-        st.error(f"❌ Error creating KPI Insights: {e}")
-    
-    st.success("🎉 All Business Intelligence views created successfully!")
+        st.error(f"❌ Error creating Business Intelligence views: {e}")
 
 def display_frontend_insights(client, project_id, dataset_id):
     """Display comprehensive business intelligence insights in the frontend"""
@@ -285,10 +506,11 @@ def display_frontend_insights(client, project_id, dataset_id):
     st.subheader("📊 Business Intelligence Dashboard")
     
     try:
+        views = _fetch_insight_views(project_id, dataset_id)
+        
         # 1. Executive Summary KPIs
         st.write("**🎯 Executive Summary - Key Performance Indicators**")
-        executive_query = f"SELECT * FROM `{project_id}.{dataset_id}.retail_sales_executive_summary`"
-        executive_data = client.query(executive_query).to_dataframe()
+        executive_data = views["retail_sales_executive_summary"]
         
         if not executive_data.empty:
             col1, col2, col3, col4 = st.columns(4)
@@ -315,10 +537,11 @@ def display_frontend_insights(client, project_id, dataset_id):
         
         # 2. Sales Performance Insights
         st.write("**📈 Sales Performance by Product Category**")
-        sales_query = f"SELECT * FROM `{project_id}.{dataset_id}.retail_sales_performance_insights` LIMIT 10"
-        sales_data = client.query(sales_query).to_dataframe()
+        sales_data = views["retail_sales_performance_insights"]
         
         if not sales_data.empty:
+            sales_data = sales_data.nlargest(10, 'total_revenue')
+            
             # Create a comprehensive chart
             fig = px.bar(
                 sales_data, 
@@ -342,10 +565,11 @@ def display_frontend_insights(client, project_id, dataset_id):
         
         # 3. Store Performance Analysis
         st.write("**🏪 Store Performance & Efficiency Analysis**")
-        store_query = f"SELECT * FROM `{project_id}.{dataset_id}.retail_sales_store_insights` LIMIT 10"
-        store_data = client.query(store_query).to_dataframe()
+        store_data = views["retail_sales_store_insights"]
         
         if not store_data.empty:
+            store_data = store_data.nlargest(10, 'total_revenue')
+            
             col1, col2 = st.columns(2)
             
             with col1:
@@ -384,10 +608,11 @@ def display_frontend_insights(client, project_id, dataset_id):
         
         # 4. Customer Segmentation Insights
         st.write("**👥 Customer Segmentation & Value Analysis**")
-        customer_query = f"SELECT * FROM `{project_id}.{dataset_id}.retail_sales_customer_segmentation`"
-        customer_data = client.query(customer_query).to_dataframe()
+        customer_data = views["retail_sales_customer_segmentation"]
         
         if not customer_data.empty:
+            customer_data = customer_data.sort_values('avg_spending', ascending=False)
+            
             col1, col2 = st.columns(2)
             
             with col1:
@@ -422,10 +647,11 @@ def display_frontend_insights(client, project_id, dataset_id):
         
         # 5. Product Performance Insights
         st.write("**🛍️ Product Performance & Market Analysis**")
-        product_query = f"SELECT * FROM `{project_id}.{dataset_id}.retail_sales_product_insights` ORDER BY total_revenue DESC LIMIT 15"
-        product_data = client.query(product_query).to_dataframe()
+        product_data = views["retail_sales_product_insights"]
         
         if not product_data.empty:
+            product_data = product_data.nlargest(15, 'total_revenue')
+            
             # Top products by revenue
             fig = px.bar(
                 product_data,
@@ -448,19 +674,28 @@ def display_frontend_insights(client, project_id, dataset_id):
         
         # 6. Temporal Trends & Seasonality
         st.write("**📅 Sales Trends & Seasonal Patterns**")
-        temporal_query = f"SELECT * FROM `{project_id}.{dataset_id}.retail_sales_temporal_insights` ORDER BY year, month"
-        temporal_data = client.query(temporal_query).to_dataframe()
+        temporal_data = views["retail_sales_temporal_insights"]
         
         if not temporal_data.empty:
-            # Create date column for plotting
-            temporal_data['date'] = pd.to_datetime(temporal_data[['year', 'month']].assign(day=1))
+            temporal_data['sale_date'] = pd.to_datetime(temporal_data['sale_date'])
+            temporal_data = temporal_data.sort_values('sale_date')
+            
+            # The view holds one row per day; month and season are derived here
+            # so the same rows serve both charts
+            temporal_data['date'] = temporal_data['sale_date'].dt.to_period('M').dt.to_timestamp()
+            temporal_data['season'] = temporal_data['sale_date'].dt.month.map(SEASON_MAP)
+            
+            monthly_data = temporal_data.groupby('date').agg(
+                monthly_revenue=('daily_revenue', 'sum'),
+                transaction_count=('transaction_count', 'sum')
+            ).reset_index()
             
             col1, col2 = st.columns(2)
             
             with col1:
                 # Monthly revenue trends
                 fig = px.line(
-                    temporal_data,
+                    monthly_data,
                     x='date',
                     y='monthly_revenue',
                     title="Monthly Revenue Trends",
@@ -469,17 +704,17 @@ def display_frontend_insights(client, project_id, dataset_id):
                 st.plotly_chart(fig, use_container_width=True)
             
             with col2:
-                # Seasonal analysis
-                seasonal_data = temporal_data.groupby('season').agg({
-                    'monthly_revenue': 'sum',
-                    'transaction_count': 'sum',
-                    'unique_customers': 'sum'
-                }).reset_index()
+                # Seasonal analysis. Distinct customers don't add up across
+                # days, so only the additive measures are rolled up
+                seasonal_data = temporal_data.groupby('season').agg(
+                    seasonal_revenue=('daily_revenue', 'sum'),
+                    transaction_count=('transaction_count', 'sum')
+                ).reset_index()
                 
                 fig = px.bar(
                     seasonal_data,
                     x='season',
-                    y='monthly_revenue',
+                    y='seasonal_revenue',
                     title="Revenue by Season",
                     color='transaction_count'
                 )
@@ -487,10 +722,11 @@ def display_frontend_insights(client, project_id, dataset_id):
         
         # 7. Payment & Financial Insights
         st.write("**💳 Payment Methods & Financial Analysis**")
-        payment_query = f"SELECT * FROM `{project_id}.{dataset_id}.retail_sales_payment_insights`"
-        payment_data = client.query(payment_query).to_dataframe()
+        payment_data = views["retail_sales_payment_insights"]
         
         if not payment_data.empty:
+            payment_data = payment_data.sort_values('total_revenue', ascending=False)
+            
             col1, col2 = st.columns(2)
             
             with col1:
@@ -525,8 +761,7 @@ def display_frontend_insights(client, project_id, dataset_id):
         
         # 8. Data Quality Assessment
         st.write("**🔍 Data Quality & Completeness Metrics**")
-        quality_query = f"SELECT * FROM `{project_id}.{dataset_id}.retail_sales_data_quality`"
-        quality_data = client.query(quality_query).to_dataframe()
+        quality_data = views["retail_sales_data_quality"]
         
         if not quality_data.empty:
             st.info("📊 Data Quality Assessment:")
@@ -544,8 +779,7 @@ def display_frontend_insights(client, project_id, dataset_id):
         
         # 9. Business Intelligence Summary
         st.write("**🎯 Business Intelligence Summary**")
-        kpi_query = f"SELECT * FROM `{project_id}.{dataset_id}.retail_sales_kpi_insights`"
-        kpi_data = client.query(kpi_query).to_dataframe()
+        kpi_data = views["retail_sales_kpi_insights"]
         
         if not kpi_data.empty:
             st.success("📊 **Key Business Insights:**")
@@ -565,30 +799,159 @@ def display_frontend_insights(client, project_id, dataset_id):
         st.error(f"❌ Error displaying insights: {e}")
         st.info("💡 Make sure all analysis views have been created first")
 
-def display_direct_insights(client, project_id, dataset_id):
-    """Display insights directly from the source table without requiring views"""
+def display_direct_insights(client, project_id, dataset_id, start_date=None, end_date=None):
+    """Display insights straight from the typed sales table without requiring views"""
     
-    st.subheader("📊 Direct Insights from Source Table")
+    st.subheader("📊 Direct Insights from the Typed Sales Table")
     
-    table_ref = f"{project_id}.{dataset_id}.retail_sales"
+    # retail_sales_typed is partitioned by transaction month, so bounding
+    # transaction_date lets BigQuery read only the matching partitions, and
+    # its amounts and quantities are already numeric
+    table_ref = f"{project_id}.{dataset_id}.retail_sales_typed"
+    
+    if start_date is not None and end_date is not None:
+        date_filter = "transaction_date BETWEEN @start_date AND @end_date"
+        query_params = (("start_date", "DATE", start_date), ("end_date", "DATE", end_date))
+    else:
+        date_filter = "TRUE"
+        query_params = ()
     
     try:
-        # 1. Basic KPIs
-        st.write("**🎯 Key Performance Indicators (KPIs)**")
-        
+        # Distinct counts use HyperLogLog++ estimates: they are within about a
+        # percent of the exact figure, which is plenty for these charts, and
+        # avoid the shuffle an exact COUNT(DISTINCT) needs
         basic_query = f"""
         SELECT 
             COUNT(*) as total_records,
-            AVG(CAST(total_amount AS FLOAT64)) as avg_transaction_value,
-            SUM(CAST(total_amount AS FLOAT64)) as total_revenue,
-            AVG(CAST(quantity AS FLOAT64)) as avg_quantity,
-            COUNT(DISTINCT customer_id) as unique_customers,
-            COUNT(DISTINCT store_name) as unique_stores,
-            COUNT(DISTINCT product_category) as product_categories
+            AVG(amt) as avg_transaction_value,
+            SUM(amt) as total_revenue,
+            AVG(qty) as avg_quantity,
+            APPROX_COUNT_DISTINCT(customer_id) as unique_customers,
+            APPROX_COUNT_DISTINCT(store_name) as unique_stores,
+            APPROX_COUNT_DISTINCT(product_category) as product_categories
         FROM `{table_ref}`
+        WHERE {date_filter}
         """
         
-        basic_stats = client.query(basic_query).to_dataframe()
+        category_query = f"""
+        SELECT 
+            product_category,
+            COUNT(*) as transaction_count,
+            SUM(amt) as total_revenue,
+            AVG(amt) as avg_transaction_value,
+            APPROX_COUNT_DISTINCT(customer_id) as unique_customers
+        FROM `{table_ref}`
+        WHERE {date_filter}
+            AND product_category IS NOT NULL
+        GROUP BY product_category
+        ORDER BY total_revenue DESC
+        LIMIT 10
+        """
+        
+        store_query = f"""
+        SELECT 
+            store_name,
+            COUNT(*) as transaction_count,
+            SUM(amt) as total_revenue,
+            AVG(amt) as avg_transaction_value,
+            APPROX_COUNT_DISTINCT(customer_id) as unique_customers
+        FROM `{table_ref}`
+        WHERE {date_filter}
+            AND store_name IS NOT NULL
+        GROUP BY store_name
+        ORDER BY total_revenue DESC
+        LIMIT 10
+        """
+        
+        temporal_query = f"""
+        SELECT 
+            EXTRACT(YEAR FROM transaction_date) as year,
+            EXTRACT(MONTH FROM transaction_date) as month,
+            COUNT(*) as transaction_count,
+            SUM(amt) as monthly_revenue
+        FROM `{table_ref}`
+        WHERE {date_filter}
+            AND transaction_date IS NOT NULL
+        GROUP BY year, month
+        ORDER BY year, month
+        """
+        
+        customer_query = f"""
+        SELECT 
+            customer_id,
+            COUNT(*) as total_transactions,
+            SUM(amt) as total_spent,
+            AVG(amt) as avg_transaction_value,
+            APPROX_COUNT_DISTINCT(store_name) as stores_visited,
+            APPROX_COUNT_DISTINCT(product_category) as product_categories_purchased
+        FROM `{table_ref}`
+        WHERE {date_filter}
+            AND customer_id IS NOT NULL
+        GROUP BY customer_id
+        ORDER BY total_spent DESC
+        LIMIT 20
+        """
+        
+        product_query = f"""
+        SELECT 
+            product_name,
+            product_category,
+            COUNT(*) as times_purchased,
+            SUM(qty) as total_quantity_sold,
+            SUM(amt) as total_revenue
+        FROM `{table_ref}`
+        WHERE {date_filter}
+            AND product_name IS NOT NULL
+        GROUP BY product_name, product_category
+        ORDER BY total_revenue DESC
+        LIMIT 15
+        """
+        
+        payment_query = f"""
+        SELECT 
+            payment_method,
+            COUNT(*) as transaction_count,
+            SUM(amt) as total_revenue,
+            AVG(amt) as avg_transaction_value
+        FROM `{table_ref}`
+        WHERE {date_filter}
+            AND payment_method IS NOT NULL
+        GROUP BY payment_method
+        ORDER BY total_revenue DESC
+        """
+        
+        quality_query = f"""
+        SELECT 
+            COUNT(*) as total_records,
+            COUNTIF(transaction_date IS NOT NULL) as records_with_date,
+            COUNTIF(product_name IS NOT NULL) as records_with_product,
+            COUNTIF(store_name IS NOT NULL) as records_with_store,
+            COUNTIF(customer_id IS NOT NULL) as records_with_customer,
+            ROUND(COUNTIF(transaction_date IS NOT NULL) * 100.0 / COUNT(*), 2) as date_completeness_pct,
+            ROUND(COUNTIF(product_name IS NOT NULL) * 100.0 / COUNT(*), 2) as product_completeness_pct,
+            ROUND(COUNTIF(store_name IS NOT NULL) * 100.0 / COUNT(*), 2) as store_completeness_pct,
+            ROUND(COUNTIF(customer_id IS NOT NULL) * 100.0 / COUNT(*), 2) as customer_completeness_pct
+        FROM `{table_ref}`
+        WHERE {date_filter}
+        """
+        
+        # The queries are independent, so they are submitted together and
+        # BigQuery runs them side by side
+        results = _fetch_query_dfs({
+            "basic": basic_query,
+            "category": category_query,
+            "store": store_query,
+            "temporal": temporal_query,
+            "customer": customer_query,
+            "product": product_query,
+            "payment": payment_query,
+            "quality": quality_query,
+        }, query_params)
+        
+        # 1. Basic KPIs
+        st.write("**🎯 Key Performance Indicators (KPIs)**")
+        
+        basic_stats = results["basic"]
         
         if not basic_stats.empty:
             col1, col2, col3, col4 = st.columns(4)
@@ -605,21 +968,7 @@ def display_direct_insights(client, project_id, dataset_id):
         # 2. Category Performance
         st.write("**📈 Product Category Performance**")
         
-        category_query = f"""
-        SELECT 
-            product_category,
-            COUNT(*) as transaction_count,
-            SUM(CAST(total_amount AS FLOAT64)) as total_revenue,
-            AVG(CAST(total_amount AS FLOAT64)) as avg_transaction_value,
-            COUNT(DISTINCT customer_id) as unique_customers
-        FROM `{table_ref}`
-        WHERE product_category IS NOT NULL
-        GROUP BY product_category
-        ORDER BY total_revenue DESC
-        LIMIT 10
-        """
-        
-        category_data = client.query(category_query).to_dataframe()
+        category_data = results["category"]
         
         if not category_data.empty:
             fig = px.bar(
@@ -640,21 +989,7 @@ def display_direct_insights(client, project_id, dataset_id):
         # 3. Store Performance
         st.write("**🏪 Store Performance Analysis**")
         
-        store_query = f"""
-        SELECT 
-            store_name,
-            COUNT(*) as transaction_count,
-            SUM(CAST(total_amount AS FLOAT64)) as total_revenue,
-            AVG(CAST(total_amount AS FLOAT64)) as avg_transaction_value,
-            COUNT(DISTINCT customer_id) as unique_customers
-        FROM `{table_ref}`
-        WHERE store_name IS NOT NULL
-        GROUP BY store_name
-        ORDER BY total_revenue DESC
-        LIMIT 10
-        """
-        
-        store_data = client.query(store_query).to_dataframe()
+        store_data = results["store"]
         
         if not store_data.empty:
             fig = px.scatter(
@@ -671,19 +1006,7 @@ def display_direct_insights(client, project_id, dataset_id):
         # 4. Temporal Trends
         st.write("**📅 Sales Trends Over Time**")
         
-        temporal_query = f"""
-        SELECT 
-            EXTRACT(YEAR FROM transaction_date) as year,
-            EXTRACT(MONTH FROM transaction_date) as month,
-            COUNT(*) as transaction_count,
-            SUM(CAST(total_amount AS FLOAT64)) as monthly_revenue
-        FROM `{table_ref}`
-        WHERE transaction_date IS NOT NULL
-        GROUP BY year, month
-        ORDER BY year, month
-        """
-        
-        temporal_data = client.query(temporal_query).to_dataframe()
+        temporal_data = results["temporal"]
         
         if not temporal_data.empty:
             # Create date column for plotting
@@ -701,22 +1024,7 @@ def display_direct_insights(client, project_id, dataset_id):
         # 5. Customer Behavior
         st.write("**👥 Customer Behavior Insights**")
         
-        customer_query = f"""
-        SELECT 
-            customer_id,
-            COUNT(*) as total_transactions,
-            SUM(CAST(total_amount AS FLOAT64)) as total_spent,
-            AVG(CAST(total_amount AS FLOAT64)) as avg_transaction_value,
-            COUNT(DISTINCT store_name) as stores_visited,
-            COUNT(DISTINCT product_category) as product_categories_purchased
-        FROM `{table_ref}`
-        WHERE customer_id IS NOT NULL
-        GROUP BY customer_id
-        ORDER BY total_spent DESC
-        LIMIT 20
-        """
-        
-        customer_data = client.query(customer_query).to_dataframe()
+        customer_data = results["customer"]
         
         if not customer_data.empty:
             col1, col2 = st.columns(2)
@@ -744,21 +1052,7 @@ def display_direct_insights(client, project_id, dataset_id):
         # 6. Product Performance
         st.write("**🛍️ Top Performing Products**")
         
-        product_query = f"""
-        SELECT 
-            product_name,
-            product_category,
-            COUNT(*) as times_purchased,
-            SUM(CAST(quantity AS INT64)) as total_quantity_sold,
-            SUM(CAST(total_amount AS FLOAT64)) as total_revenue
-        FROM `{table_ref}`
-        WHERE product_name IS NOT NULL
-        GROUP BY product_name, product_category
-        ORDER BY total_revenue DESC
-        LIMIT 15
-        """
-        
-        product_data = client.query(product_query).to_dataframe()
+        product_data = results["product"]
         
         if not product_data.empty:
             fig = px.bar(
@@ -775,19 +1069,7 @@ def display_direct_insights(client, project_id, dataset_id):
         # 7. Payment Method Analysis
         st.write("**💳 Payment Method Preferences**")
         
-        payment_query = f"""
-        SELECT 
-            payment_method,
-            COUNT(*) as transaction_count,
-            SUM(CAST(total_amount AS FLOAT64)) as total_revenue,
-            AVG(CAST(total_amount AS FLOAT64)) as avg_transaction_value
-        FROM `{table_ref}`
-        WHERE payment_method IS NOT NULL
-        GROUP BY payment_method
-        ORDER BY total_revenue DESC
-        """
-        
-        payment_data = client.query(payment_query).to_dataframe()
+        payment_data = results["payment"]
         
         if not payment_data.empty:
             col1, col2 = st.columns(2)
@@ -813,21 +1095,7 @@ def display_direct_insights(client, project_id, dataset_id):
         # 8. Data Quality Assessment
         st.write("**🔍 Data Quality Assessment**")
         
-        quality_query = f"""
-        SELECT 
-            COUNT(*) as total_records,
-            COUNTIF(transaction_date IS NOT NULL) as records_with_date,
-            COUNTIF(product_name IS NOT NULL) as records_with_product,
-            COUNTIF(store_name IS NOT NULL) as records_with_store,
-            COUNTIF(customer_id IS NOT NULL) as records_with_customer,
-            ROUND(COUNTIF(transaction_date IS NOT NULL) * 100.0 / COUNT(*), 2) as date_completeness_pct,
-            ROUND(COUNTIF(product_name IS NOT NULL) * 100.0 / COUNT(*), 2) as product_completeness_pct,
-            ROUND(COUNTIF(store_name IS NOT NULL) * 100.0 / COUNT(*), 2) as store_completeness_pct,
-            ROUND(COUNTIF(customer_id IS NOT NULL) * 100.0 / COUNT(*), 2) as customer_completeness_pct
-        FROM `{table_ref}`
-        """
-        
-        quality_data = client.query(quality_query).to_dataframe()
+        quality_data = results["quality"]
         
         if not quality_data.empty:
             st.info("📊 Data Quality Metrics:")
@@ -844,7 +1112,7 @@ def display_direct_insights(client, project_id, dataset_id):
     
     except Exception as e:
         st.error(f"❌ Error displaying direct insights: {e}")
-        st.info("💡 This analysis works directly from the source table")
+        st.info("💡 This analysis reads retail_sales_typed, which is built with the analysis views")
 
 def analyze_retail_sales_table():
     """Main function to analyze the retail_sales table and create comprehensive analysis views"""
@@ -853,21 +1121,14 @@ def analyze_retail_sales_table():
     st.write("Analyzing `moonlit-autumn-468306-p6.assignment_one_1.retail_sales`")
     
     try:
-        # Initialize BigQuery client with your credentials
-        credentials = service_account.Credentials.from_service_account_file(
-            "istanbul_sales_analysis/API.JSON",
-            scopes=["https://www.googleapis.com/auth/cloud-platform"]
-        )
-        
-        client = bigquery.Client(
-            credentials=credentials,
-            project=credentials.project_id
-        )
+        # Reuse the cached BigQuery client across reruns
+        client = get_bigquery_client()
+        project_id = client.project
         
-        st.success(f"✅ Connected to BigQuery project: {credentials.project_id}")
+        st.success(f"✅ Connected to BigQuery project: {project_id}")
         
         # Define the table reference
-        table_ref = f"{credentials.project_id}.assignment_one_1.retail_sales"
+        table_ref = f"{project_id}.assignment_one_1.retail_sales"
         
         # Get table information
         st.subheader("📊 Table Information")
@@ -907,14 +1168,39 @@ def analyze_retail_sales_table():
         st.subheader("📋 Sample Data")
         with st.spinner("Fetching sample data..."):
             sample_query = f"SELECT * FROM `{table_ref}` LIMIT 10"
-            sample_df = client.query(sample_query).to_dataframe()
+            sample_df = client.query(sample_query).to_dataframe(create_bqstorage_client=True)
             st.dataframe(sample_df, use_container_width=True)
         
         # Create analysis views and procedures
-        create_analysis_views_and_procedures(client, credentials.project_id, "assignment_one_1")
+        create_analysis_views_and_procedures(client, project_id, "assignment_one_1")
         
         # Display frontend insights
-        display_frontend_insights(client, credentials.project_id, "assignment_one_1")
+        display_frontend_insights(client, project_id, "assignment_one_1")
+        
+        # Direct insights over a chosen transaction date range
+        if st.checkbox("Show direct insights for a date range"):
+            date_bounds = _fetch_query_df(
+                f"SELECT MIN(transaction_date) as first_date, MAX(transaction_date) as last_date "
+                f"FROM `{project_id}.assignment_one_1.retail_sales_typed`"
+            )
+            first_date = date_bounds.iloc[0]['first_date']
+            last_date = date_bounds.iloc[0]['last_date']
+            
+            # An empty table, or one with no parseable dates, has no bounds
+            # for the picker
+            if pd.isna(first_date) or pd.isna(last_date):
+                st.info("ℹ️ retail_sales_typed has no transaction dates to pick a range from")
+            else:
+                selected_dates = st.date_input(
+                    "Transaction date range",
+                    value=(first_date, last_date),
+                    min_value=first_date,
+                    max_value=last_date
+                )
+                # The picker returns a single date until both ends are chosen
+                if len(selected_dates) == 2:
+                    start_date, end_date = selected_dates
+                    display_direct_insights(client, project_id, "assignment_one_1", start_date, end_date)
         
     except Exception as e:
         st.error(f"❌ Error in analysis: {e}")
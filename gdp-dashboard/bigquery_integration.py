@@ -498,6 +498,21 @@ class BigQueryIntegration:
             st.error(f"❌ Error exporting results: {e}")
 
 # Streamlit Integration Functions
+@st.cache_data(show_spinner=False)
+def _read_csv(path, mtime):
+    """Parse a CSV with the pyarrow reader, cached on its path and modification time"""
+    return pd.read_csv(path, engine='pyarrow')
+
+def load_csv(path):
+    """
+    Load a local CSV for upload with the pyarrow reader
+
+    Cached so repeated uploads of the same file don't re-parse it; the
+    file's modification time is part of the cache key, so an edited file
+    is read again.
+    """
+    return _read_csv(path, os.path.getmtime(path))
+
 def bigquery_streamlit_integration():
     """Main function to integrate BigQuery with Streamlit"""
     st.header("🔗 BigQuery Integration")
@@ -529,24 +544,24 @@ def bigquery_streamlit_integration():
     
     if upload_option != "None":
         if upload_option == "Istanbul Sales":
-            # Load Istanbul data
-            istanbul_df = pd.read_csv("data/istanbul_sales_data.csv")
+            # Load Istanbul data only once the upload is requested
             if st.sidebar.button("📤 Upload Istanbul Data"):
                 with st.spinner("Uploading Istanbul sales data..."):
+                    istanbul_df = load_csv("data/istanbul_sales_data.csv")
                     bq_client.upload_data_to_bigquery(istanbul_df, "istanbul_sales")
         
         elif upload_option == "College Students":
-            # Load College data
-            college_df = pd.read_csv("data/College Student Analysis.csv")
+            # Load College data only once the upload is requested
             if st.sidebar.button("📤 Upload College Data"):
                 with st.spinner("Uploading college student data..."):
+                    college_df = load_csv("data/College Student Analysis.csv")
                     bq_client.upload_data_to_bigquery(college_df, "college_students")
         
         elif upload_option == "Retail Sales":
-            # Load Retail data
-            retail_df = pd.read_csv("retail_sales_analysis/retail_sales_dataset.csv")
+            # Load Retail data only once the upload is requested
             if st.sidebar.button("📤 Upload Retail Data"):
                 with st.spinner("Uploading retail sales data..."):
+                    retail_df = load_csv("retail_sales_analysis/retail_sales_dataset.csv")
                     bq_client.upload_data_to_bigquery(retail_df, "retail_sales")
     
     # Analysis queries
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Build the typed retail_sales_clean table and the retail_sales_rollup materialized
+view used by the dashboard's query templates. The dashboard rebuilds them itself
+whenever retail_sales changes; running this script forces a rebuild
+"""
+
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+from google.oauth2 import service_account
+
+DATASET_ID = "assignment_one_1"
+
+def create_clean_table(client, project_id, dataset_id=DATASET_ID):
+    """Materialize retail_sales with native column types so queries need no per-row CASTs"""
+
+    # SAFE_CAST turns unparseable values into NULLs instead of failing the
+    # whole job, and is a no-op for columns that are already typed. Monthly
+    # partitions let date-bounded queries skip the months they don't touch,
+    # and clustering co-locates rows for the category/gender/age/customer
+    # groupings. The age bucket is stored once here instead of being derived
+    # with a CASE in every query that groups by it
+    clean_table_query = f"""
+    CREATE OR REPLACE TABLE `{project_id}.{dataset_id}.retail_sales_clean`
+    PARTITION BY DATE_TRUNC(`Date`, MONTH)
+    CLUSTER BY `Product Category`, `Gender`, age_bucket, `Customer ID`
+    AS
+    SELECT
+        *,
+        CASE
+            WHEN `Age` IS NULL THEN NULL
+            WHEN `Age` < 18 THEN 'Under 18'
+            WHEN `Age` BETWEEN 18 AND 25 THEN '18-25'
+            WHEN `Age` BETWEEN 26 AND 35 THEN '26-35'
+            WHEN `Age` BETWEEN 36 AND 45 THEN '36-45'
+            WHEN `Age` BETWEEN 46 AND 55 THEN '46-55'
+            ELSE '55+'
+        END as age_bucket
+    FROM (
+        SELECT
+            `Transaction ID`,
+            SAFE_CAST(`Date` AS DATE) as `Date`,
+            `Customer ID`,
+            `Gender`,
+            SAFE_CAST(`Age` AS INT64) as `Age`,
+            `Product Category`,
+            SAFE_CAST(`Quantity` AS INT64) as `Quantity`,
+            SAFE_CAST(`Price per Unit` AS FLOAT64) as `Price per Unit`,
+            SAFE_CAST(`Total Amount` AS FLOAT64) as `Total Amount`
+        FROM `{project_id}.{dataset_id}.retail_sales`
+    )
+    """
+
+    client.query(clean_table_query).result()
+
+    table = client.get_table(f"{project_id}.{dataset_id}.retail_sales_clean")
+    print(f"✅ Created retail_sales_clean: {table.num_rows:,} rows")
+
+def clean_tables_are_stale(client, project_id, dataset_id=DATASET_ID):
+    """Check whether retail_sales_clean or its rollup is missing, or older than retail_sales"""
+    try:
+        clean_table = client.get_table(f"{project_id}.{dataset_id}.retail_sales_clean")
+        client.get_table(f"{project_id}.{dataset_id}.retail_sales_rollup")
+    except NotFound:
+        return True
+
+    return clean_table.modified < client.get_table(f"{project_id}.{dataset_id}.retail_sales").modified
+
+def create_rollup_view(client, project_id, dataset_id=DATASET_ID):
+    """Pre-aggregate retail_sales_clean by category, gender, month and age group"""
+
+    # BigQuery refreshes the materialized view incrementally, so the grouped
+    # templates read one row per dimension combination instead of every sale.
+    # The view is partitioned by month to line up with the monthly partitions
+    # of retail_sales_clean
+    rollup_view_query = f"""
+    CREATE OR REPLACE MATERIALIZED VIEW `{project_id}.{dataset_id}.retail_sales_rollup`
+    PARTITION BY DATE_TRUNC(month_start, MONTH)
+    AS
+    SELECT
+        `Product Category`,
+        `Gender`,
+        DATE_TRUNC(`Date`, MONTH) as month_start,
+        age_bucket,
+        COUNT(*) as transaction_count,
+        COUNT(`Total Amount`) as amount_count,
+        SUM(`Total Amount`) as revenue,
+        SUM(`Quantity`) as quantity
+    FROM `{project_id}.{dataset_id}.retail_sales_clean`
+    GROUP BY `Product Category`, `Gender`, month_start, age_bucket
+    """
+
+    client.query(rollup_view_query).result()
+    print("✅ Created materialized view: retail_sales_rollup")
+
+def main():
+    """Connect with the local service account and rebuild the clean table and rollup"""
+
+    print("🏗️ Building retail_sales_clean and retail_sales_rollup")
+    print("=" * 50)
+
+    try:
+        # Load credentials
+        credentials = service_account.Credentials.from_service_account_file(
+            "istanbul_sales_analysis/API.JSON",
+            scopes=["https://www.googleapis.com/auth/cloud-platform"]
+        )
+
+        client = bigquery.Client(
+            credentials=credentials,
+            project=credentials.project_id
+        )
+
+        print(f"✅ Connected to BigQuery project: {credentials.project_id}")
+
+        create_clean_table(client, credentials.project_id)
+        create_rollup_view(client, credentials.project_id)
+
+    except Exception as e:
+        print(f"❌ Error building retail_sales_clean and rollup: {e}")
+
+if __name__ == "__main__":
+    main()
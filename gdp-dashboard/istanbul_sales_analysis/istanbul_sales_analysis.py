@@ -15,14 +15,30 @@ def load_and_clean_data(file_path):
     """Load and clean the Istanbul sales data"""
     print("Loading and cleaning Istanbul sales data...")
     
-    # Load the CSV file
-    df = pd.read_csv(file_path)
+    # Load the CSV file with Arrow's multithreaded reader. The low-cardinality
+    # labels come in as categoricals so grouping works on integer codes, and
+    # the malformed trailer line in the export is skipped rather than read as
+    # an all-NaN row
+    df = pd.read_csv(
+        file_path,
+        engine='pyarrow',
+        on_bad_lines='skip',
+        dtype={
+            'invoice_no': str,
+            'customer_id': str,
+            'invoice_date': str,
+            'gender': 'category',
+            'category': 'category',
+            'payment_method': 'category',
+            'shopping_mall': 'category'
+        }
+    )
     
     # Basic data cleaning
-    df = df.dropna()
+    df.dropna(inplace=True)
     
-    # Convert date column
-    df['invoice_date'] = pd.to_datetime(df['invoice_date'])
+    # Convert date column; the export is ISO-formatted, so skip format inference
+    df['invoice_date'] = pd.to_datetime(df['invoice_date'], format='%Y-%m-%d')
     
     # Add derived columns
     df['total_amount'] = df['quantity'] * df['price']
@@ -67,7 +83,12 @@ def perform_correlation_analysis(df):
     
     # Select numeric columns for correlation
     numeric_columns = ['age', 'quantity', 'price', 'total_amount']
-    correlation_matrix = df[numeric_columns].corr()
+    
+    # NaNs are dropped on load, so np.corrcoef gives the same result as
+    # DataFrame.corr() without the per-pair NaN handling overhead
+    values = df[numeric_columns].to_numpy(dtype=np.float64)
+    correlation_matrix = pd.DataFrame(np.corrcoef(values, rowvar=False),
+                                      index=numeric_columns, columns=numeric_columns)
     
     return correlation_matrix
 
@@ -75,14 +96,17 @@ def analyze_sales_by_category(df):
     """Analyze sales performance by category"""
     print("Analyzing sales by category...")
     
-    category_analysis = df.groupby('category').agg({
-        'total_amount': ['sum', 'mean', 'count'],
-        'quantity': ['sum', 'mean'],
-        'price': ['mean', 'min', 'max']
-    }).round(2)
-    
-    # Flatten column names
-    category_analysis.columns = ['_'.join(col).strip() for col in category_analysis.columns]
+    # Named aggregation yields flat column names directly, no MultiIndex to join
+    category_analysis = df.groupby('category', observed=True).agg(
+        total_amount_sum=('total_amount', 'sum'),
+        total_amount_mean=('total_amount', 'mean'),
+        total_amount_count=('total_amount', 'count'),
+        quantity_sum=('quantity', 'sum'),
+        quantity_mean=('quantity', 'mean'),
+        price_mean=('price', 'mean'),
+        price_min=('price', 'min'),
+        price_max=('price', 'max')
+    ).round(2)
     
     return category_analysis
 
@@ -90,14 +114,14 @@ def analyze_sales_by_mall(df):
     """Analyze sales performance by shopping mall"""
     print("Analyzing sales by shopping mall...")
     
-    mall_analysis = df.groupby('shopping_mall').agg({
-        'total_amount': ['sum', 'mean', 'count'],
-        'quantity': ['sum', 'mean'],
-        'customer_id': 'nunique'
-    }).round(2)
-    
-    # Flatten column names
-    mall_analysis.columns = ['_'.join(col).strip() for col in mall_analysis.columns]
+    mall_analysis = df.groupby('shopping_mall', observed=True).agg(
+        total_amount_sum=('total_amount', 'sum'),
+        total_amount_mean=('total_amount', 'mean'),
+        total_amount_count=('total_amount', 'count'),
+        quantity_sum=('quantity', 'sum'),
+        quantity_mean=('quantity', 'mean'),
+        customer_id_nunique=('customer_id', 'nunique')
+    ).round(2)
     
     return mall_analysis
 
@@ -105,13 +129,13 @@ def analyze_payment_methods(df):
     """Analyze payment method preferences"""
     print("Analyzing payment methods...")
     
-    payment_analysis = df.groupby('payment_method').agg({
-        'total_amount': ['sum', 'mean', 'count'],
-        'quantity': ['sum', 'mean']
-    }).round(2)
-    
-    # Flatten column names
-    payment_analysis.columns = ['_'.join(col).strip() for col in payment_analysis.columns]
+    payment_analysis = df.groupby('payment_method', observed=True).agg(
+        total_amount_sum=('total_amount', 'sum'),
+        total_amount_mean=('total_amount', 'mean'),
+        total_amount_count=('total_amount', 'count'),
+        quantity_sum=('quantity', 'sum'),
+        quantity_mean=('quantity', 'mean')
+    ).round(2)
     
     return payment_analysis
 
@@ -143,9 +167,13 @@ def analyze_demographics(df):
     """Analyze customer demographics"""
     print("Analyzing customer demographics...")
     
-    # Age group analysis
-    df['age_group'] = pd.cut(df['age'], bins=[0, 25, 35, 45, 55, 100], 
-                            labels=['18-25', '26-35', '36-45', '46-55', '55+'])
+    # Age group analysis: bin against the right edges of (0, 25], (25, 35], ...
+    # with one searchsorted call; ages outside (0, 100] get no group, as with pd.cut
+    ages = df['age'].to_numpy()
+    age_codes = np.searchsorted(np.array([25, 35, 45, 55, 100]), ages, side='left')
+    age_codes[(ages <= 0) | (ages > 100)] = -1
+    df['age_group'] = pd.Categorical.from_codes(age_codes, ordered=True,
+                                                categories=['18-25', '26-35', '36-45', '46-55', '55+'])
     
     age_analysis = df.groupby('age_group').agg({
         'total_amount': ['sum', 'mean', 'count'],
@@ -162,16 +190,20 @@ def analyze_demographics(df):
     
     return age_analysis, gender_analysis
 
-def create_visualizations(df):
+def create_visualizations(df, category_analysis, mall_analysis, payment_analysis, gender_analysis,
+                          monthly_analysis, dow_analysis):
     """Create various visualizations"""
     print("Creating visualizations...")
     
+    # Panels reuse the per-key aggregates from the analysis step instead of
+    # re-grouping df for each chart
+    
     # Set up the plotting area
     fig, axes = plt.subplots(3, 3, figsize=(20, 15))
     fig.suptitle('Istanbul Sales Data Analysis - Key Insights', fontsize=16, fontweight='bold')
     
     # 1. Sales by Category
-    category_sales = df.groupby('category')['total_amount'].sum().sort_values(ascending=True)
+    category_sales = category_analysis['total_amount_sum'].sort_values(ascending=True)
     axes[0, 0].barh(range(len(category_sales)), category_sales.values)
     axes[0, 0].set_yticks(range(len(category_sales)))
     axes[0, 0].set_yticklabels(category_sales.index)
@@ -179,7 +211,7 @@ def create_visualizations(df):
     axes[0, 0].set_xlabel('Total Sales Amount')
     
     # 2. Sales by Mall
-    mall_sales = df.groupby('shopping_mall')['total_amount'].sum().sort_values(ascending=True)
+    mall_sales = mall_analysis['total_amount_sum'].sort_values(ascending=True)
     axes[0, 1].barh(range(len(mall_sales)), mall_sales.values)
     axes[0, 1].set_yticks(range(len(mall_sales)))
     axes[0, 1].set_yticklabels(mall_sales.index, fontsize=8)
@@ -187,7 +219,7 @@ def create_visualizations(df):
     axes[0, 1].set_xlabel('Total Sales Amount')
     
     # 3. Payment Method Distribution
-    payment_counts = df['payment_method'].value_counts()
+    payment_counts = payment_analysis['total_amount_count'].sort_values(ascending=False)
     axes[0, 2].pie(payment_counts.values, labels=payment_counts.index, autopct='%1.1f%%', startangle=90)
     axes[0, 2].set_title('Payment Method Distribution')
     
@@ -198,13 +230,13 @@ def create_visualizations(df):
     axes[1, 0].set_ylabel('Frequency')
     
     # 5. Gender vs Average Transaction Value
-    gender_avg = df.groupby('gender')['total_amount'].mean()
+    gender_avg = gender_analysis[('total_amount', 'mean')]
     axes[1, 1].bar(gender_avg.index, gender_avg.values)
     axes[1, 1].set_title('Average Transaction Value by Gender')
     axes[1, 1].set_ylabel('Average Transaction Value')
     
     # 6. Monthly Sales Trend
-    monthly_sales = df.groupby(['year', 'month'])['total_amount'].sum()
+    monthly_sales = monthly_analysis[('total_amount', 'sum')]
     monthly_sales.plot(kind='line', ax=axes[1, 2], marker='o')
     axes[1, 2].set_title('Monthly Sales Trend')
     axes[1, 2].set_xlabel('Year-Month')
@@ -212,7 +244,7 @@ def create_visualizations(df):
     axes[1, 2].tick_params(axis='x', rotation=45)
     
     # 7. Day of Week Sales
-    dow_sales = df.groupby('day_of_week')['total_amount'].sum()
+    dow_sales = dow_analysis[('total_amount', 'sum')]
     dow_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
     dow_sales = dow_sales.reindex(dow_order)
     axes[2, 0].bar(dow_sales.index, dow_sales.values)
@@ -227,7 +259,7 @@ def create_visualizations(df):
     axes[2, 1].set_ylabel('Quantity')
     
     # 9. Category vs Average Price
-    category_price = df.groupby('category')['price'].mean().sort_values(ascending=True)
+    category_price = category_analysis['price_mean'].sort_values(ascending=True)
     axes[2, 2].barh(range(len(category_price)), category_price.values)
     axes[2, 2].set_yticks(range(len(category_price)))
     axes[2, 2].set_yticklabels(category_price.index)
@@ -245,8 +277,8 @@ def generate_plantuml_diagram(df, stats_summary, category_analysis, mall_analysi
     print("Generating PlantUML diagram...")
     
     # Get top performing categories and malls
-    top_categories = category_analysis['total_amount_sum'].sort_values(ascending=False).head(5).index.tolist()
-    top_malls = mall_analysis['total_amount_sum'].sort_values(ascending=False).head(5).index.tolist()
+    top_categories = category_analysis['total_amount_sum'].nlargest(5).index.tolist()
+    top_malls = mall_analysis['total_amount_sum'].nlargest(5).index.tolist()
     
     plantuml_content = f"""@startuml Istanbul_Sales_Analysis
 
@@ -474,7 +506,8 @@ def main():
     age_analysis, gender_analysis = analyze_demographics(df)
     
     # Create visualizations
-    viz_result = create_visualizations(df)
+    viz_result = create_visualizations(df, category_analysis, mall_analysis, payment_analysis, gender_analysis,
+                                       monthly_analysis, dow_analysis)
     print(f"✓ {viz_result}")
     
     # Generate PlantUML diagram
@@ -1,14 +1,14 @@
 # -*- coding: utf-8 -*-
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import numpy as np
-from datetime import datetime
+from datetime import datetime, date
 import io
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from google.api_core.exceptions import BadRequest
 from google.cloud import bigquery
 from google.oauth2 import service_account
+from create_retail_sales_clean import clean_tables_are_stale, create_clean_table, create_rollup_view
 
 # Page configuration
 st.set_page_config(
@@ -55,6 +55,9 @@ st.markdown("""
 # Title and header
 st.markdown('<h1 class="main-header">📊 Retail Sales Analysis Dashboard</h1>', unsafe_allow_html=True)
 
+# Stamp the session once; reruns reuse it instead of reading the clock again
+st.session_state.setdefault('page_loaded_at', datetime.now())
+
 # Sidebar navigation
 st.sidebar.title("Navigation")
 page = st.sidebar.selectbox(
@@ -99,6 +102,334 @@ def get_bigquery_client():
         st.info("💡 Check your Streamlit Cloud secrets configuration")
         return None, None
 
+# Scan cap for free-form custom queries
+MAX_CUSTOM_QUERY_BYTES = 100 * 1024 * 1024
+
+@st.cache_data(ttl=600, show_spinner=False)
+def run_query(sql, project_id, maximum_bytes_billed=None, params=()):
+    """Run a query and cache the resulting DataFrame on the SQL text and project"""
+    # The client is unhashable, so fetch it from its own resource cache here
+    # rather than passing it in as a cache key
+    client, _ = get_bigquery_client()
+    # Ask for the 24-hour results cache explicitly so a repeated template is
+    # answered from BigQuery's cache with zero bytes billed, and run it at
+    # interactive priority so it is never queued behind batch work
+    job_config = bigquery.QueryJobConfig(
+        use_query_cache=True,
+        priority=bigquery.QueryPriority.INTERACTIVE,
+        maximum_bytes_billed=maximum_bytes_billed,
+        # Parameters arrive as (name, type, value) tuples so they stay hashable
+        query_parameters=[bigquery.ScalarQueryParameter(*param) for param in params]
+    )
+    # Multi-page results stream through the BigQuery Storage Read API as Arrow;
+    # results that fit in the first page still come back over REST. Keeping
+    # the columns Arrow-backed skips the copy into numpy and Python-object
+    # strings that to_dataframe() makes
+    result = client.query(sql, job_config=job_config).to_arrow(create_bqstorage_client=True)
+    return result.to_pandas(types_mapper=pd.ArrowDtype)
+
+@st.cache_data(ttl=600, show_spinner=False)
+def fetch_table_rows(table_ref, max_results):
+    """Read the first rows of a table straight from storage and cache them"""
+    # tabledata.list needs no query job, so it uses no slots and bills no bytes
+    client, _ = get_bigquery_client()
+    return client.list_rows(table_ref, max_results=max_results).to_arrow().to_pandas(types_mapper=pd.ArrowDtype)
+
+@st.cache_data(ttl=600, show_spinner=False)
+def estimate_query_bytes(sql, project_id):
+    """Dry-run a query and return the bytes it would scan"""
+    # A dry run is validated and planned but never executed or billed, so
+    # syntax errors and bad table references surface without running a job
+    client, _ = get_bigquery_client()
+    job_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
+    return client.query(sql, job_config=job_config).total_bytes_processed
+
+@st.cache_resource(ttl=3600, show_spinner=False)
+def get_table_meta(project_id, dataset, table):
+    """Fetch a table's metadata once an hour instead of on every rerun"""
+    client, _ = get_bigquery_client()
+    t = client.get_table(f"{project_id}.{dataset}.{table}")
+    return {
+        'num_rows': t.num_rows,
+        'num_bytes': t.num_bytes,
+        'location': t.location,
+        'created': t.created,
+        'modified': t.modified,
+        'schema': list(t.schema)
+    }
+
+@st.cache_resource(ttl=600, show_spinner=False)
+def ensure_clean_tables(project_id):
+    """Rebuild retail_sales_clean and its rollup when retail_sales has changed"""
+    # Checked at most every ten minutes; a check is two metadata lookups, so
+    # data uploaded into retail_sales reaches the templates without a manual step
+    client, _ = get_bigquery_client()
+    if clean_tables_are_stale(client, project_id):
+        create_clean_table(client, project_id)
+        create_rollup_view(client, project_id)
+        # Results cached from the previous build are out of date now
+        st.cache_data.clear()
+
+def require_clean_tables(project_id):
+    """Make sure the typed tables the queries read are current, or stop the page"""
+    try:
+        with st.spinner("Checking retail_sales_clean..."):
+            ensure_clean_tables(project_id)
+    except Exception as e:
+        st.error(f"❌ Error building retail_sales_clean: {e}")
+        st.stop()
+
+def load_plotly():
+    """Import plotly.express on first use and switch its JSON encoder to orjson"""
+    import plotly.express as px
+    import plotly.io as pio
+    # st.plotly_chart serializes every figure through plotly.io; orjson
+    # encodes the figure's data arrays far faster than the stdlib encoder
+    pio.json.config.default_engine = 'orjson'
+    return px
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def schema_type_chart(names, values):
+    """Build the data-type pie once per schema; tuple arguments keep it hashable"""
+    px = load_plotly()
+    return px.pie(values=list(values), names=list(names), title="Data Types Distribution")
+
+# Visualizations: each chart is a cached function of its inputs that returns
+# the figure and the data behind it, so a chart already drawn is rebuilt from
+# the cache without re-querying or re-plotting
+# Queries read the typed retail_sales_clean table, or its retail_sales_rollup
+# view where the grain allows, so none of them re-CAST columns per row
+@st.cache_data(ttl=3600, show_spinner=False)
+def viz_revenue_by_category(project_id):
+    """Bar chart of revenue per product category"""
+    px = load_plotly()
+    query = f"""
+    SELECT 
+        `Product Category`,
+        ROUND(SUM(revenue), 2) as total_revenue,
+        SUM(transaction_count) as transaction_count
+    FROM `{project_id}.assignment_one_1.retail_sales_rollup`
+    WHERE `Product Category` IS NOT NULL
+    GROUP BY `Product Category`
+    ORDER BY total_revenue DESC
+    """
+    
+    df = run_query(query, project_id)
+    
+    # Create bar chart
+    fig = px.bar(
+        df, 
+        x='Product Category', 
+        y='total_revenue',
+        title="Revenue by Product Category",
+        color='transaction_count',
+        color_continuous_scale='Viridis'
+    )
+    fig.update_layout(xaxis_tickangle=-45)
+    return fig, df
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def viz_customer_demographics(project_id):
+    """Pie chart of revenue per gender"""
+    px = load_plotly()
+    query = f"""
+    SELECT 
+        `Gender`,
+        ROUND(SUM(revenue), 2) as total_revenue,
+        SUM(transaction_count) as transaction_count,
+        ROUND(SAFE_DIVIDE(SUM(revenue), SUM(amount_count)), 2) as avg_transaction_value
+    FROM `{project_id}.assignment_one_1.retail_sales_rollup`
+    WHERE `Gender` IS NOT NULL
+    GROUP BY `Gender`
+    ORDER BY total_revenue DESC
+    """
+    
+    df = run_query(query, project_id)
+    
+    # Create pie chart
+    fig = px.pie(
+        df,
+        values='total_revenue',
+        names='Gender',
+        title="Revenue Distribution by Gender"
+    )
+    return fig, df
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def viz_monthly_trends(project_id):
+    """Line chart of monthly revenue"""
+    px = load_plotly()
+    query = f"""
+    SELECT 
+        month_start as month,
+        ROUND(SUM(revenue), 2) as monthly_revenue,
+        SUM(transaction_count) as transaction_count
+    FROM `{project_id}.assignment_one_1.retail_sales_rollup`
+    WHERE month_start IS NOT NULL
+    GROUP BY month
+    ORDER BY month
+    """
+    
+    df = run_query(query, project_id)
+    
+    # Create line chart; the rollup's month_start is already the first of the month
+    fig = px.line(
+        df,
+        x='month',
+        y='monthly_revenue',
+        title="Monthly Revenue Trends",
+        markers=True
+    )
+    fig.update_layout(xaxis_title="Month", yaxis_title="Revenue ($)")
+    return fig, df
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def viz_customer_spending(project_id, bins=20):
+    """Histogram of total spend across all customers, binned in BigQuery"""
+    px = load_plotly()
+    # Equal-width bins between the smallest and largest customer total; the
+    # top bin is closed so the maximum lands in it rather than in bin 20
+    query = f"""
+    WITH totals AS (
+        SELECT 
+            `Customer ID`,
+            SUM(`Total Amount`) as total_spent
+        FROM `{project_id}.assignment_one_1.retail_sales_clean`
+        WHERE `Customer ID` IS NOT NULL
+        GROUP BY `Customer ID`
+    ),
+    bounds AS (
+        SELECT MIN(total_spent) as lo, MAX(total_spent) as hi FROM totals
+    )
+    SELECT 
+        ROUND(lo + bin * (hi - lo) / @bins, 2) as bin_start,
+        ROUND(lo + (bin + 1) * (hi - lo) / @bins, 2) as bin_end,
+        COUNT(*) as customer_count
+    FROM (
+        SELECT 
+            LEAST(IFNULL(CAST(FLOOR(SAFE_DIVIDE(total_spent - lo, hi - lo) * @bins) AS INT64), 0), @bins - 1) as bin,
+            lo,
+            hi
+        FROM totals CROSS JOIN bounds
+    )
+    GROUP BY bin, lo, hi
+    ORDER BY bin
+    """
+    
+    df = run_query(query, project_id, params=(("bins", "INT64", bins),))
+    
+    # Create histogram from the pre-computed bins
+    fig = px.bar(
+        df,
+        x='bin_start',
+        y='customer_count',
+        title="Customer Spending Distribution",
+        labels={'bin_start': 'Total Amount Spent ($)', 'customer_count': 'Customers'}
+    )
+    # Draw each bar from its bin's left edge instead of centring it there
+    fig.update_traces(offset=0)
+    fig.update_layout(bargap=0)
+    return fig, df
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def viz_age_groups(project_id):
+    """Bar chart of revenue per age group"""
+    px = load_plotly()
+    query = f"""
+    SELECT 
+        age_bucket as age_group,
+        SUM(transaction_count) as transaction_count,
+        ROUND(SUM(revenue), 2) as total_revenue,
+        ROUND(SAFE_DIVIDE(SUM(revenue), SUM(amount_count)), 2) as avg_transaction_value
+    FROM `{project_id}.assignment_one_1.retail_sales_rollup`
+    WHERE age_bucket IS NOT NULL
+    GROUP BY age_bucket
+    ORDER BY total_revenue DESC
+    """
+    
+    df = run_query(query, project_id)
+    
+    # Create bar chart
+    fig = px.bar(
+        df,
+        x='age_group',
+        y='total_revenue',
+        title="Revenue by Age Group",
+        color='transaction_count',
+        color_continuous_scale='Viridis'
+    )
+    return fig, df
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def viz_product_performance(project_id):
+    """Horizontal bar chart of the top 20 product categories by revenue"""
+    px = load_plotly()
+    query = f"""
+    SELECT 
+        `Product Category`,
+        SUM(transaction_count) as times_purchased,
+        ROUND(SUM(revenue), 2) as total_revenue,
+        SUM(quantity) as total_quantity_sold
+    FROM `{project_id}.assignment_one_1.retail_sales_rollup`
+    WHERE `Product Category` IS NOT NULL
+    GROUP BY `Product Category`
+    ORDER BY total_revenue DESC
+    LIMIT 20
+    """
+    
+    df = run_query(query, project_id)
+    
+    # Create horizontal bar chart
+    fig = px.bar(
+        df,
+        y='Product Category',
+        x='total_revenue',
+        orientation='h',
+        title="Top 20 Product Categories by Revenue",
+        color='times_purchased',
+        color_continuous_scale='Plasma'
+    )
+    return fig, df
+
+# Chart name -> (builder, caption for the data table under it)
+VISUALIZATIONS = {
+    "Revenue by Category": (viz_revenue_by_category, "**Category Revenue Data:**"),
+    "Customer Demographics": (viz_customer_demographics, "**Customer Demographics Data:**"),
+    "Monthly Trends": (viz_monthly_trends, "**Monthly Trends Data:**"),
+    "Customer Spending": (viz_customer_spending, "**Customer Spending Distribution Data:**"),
+    "Age Group Analysis": (viz_age_groups, "**Age Group Analysis Data:**"),
+    "Product Performance": (viz_product_performance, "**Product Performance Data (Top 20):**")
+}
+
+def to_csv_bytes(df):
+    """Serialize a result frame to CSV bytes with Arrow's C++ writer"""
+    # Writing straight into a byte buffer skips pandas' Python-level writer
+    # and the intermediate str copy of the whole file
+    buffer = io.BytesIO()
+    pacsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), buffer)
+    return buffer.getvalue()
+
+# Download formats: file extension and MIME type for each option
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/octet-stream"),
+    "Feather": ("feather", "application/octet-stream"),
+}
+
+def export_results(df, fmt):
+    """Serialize a result frame in the chosen download format"""
+    if fmt == "CSV":
+        return to_csv_bytes(df)
+
+    # Parquet and Feather keep the column dtypes and are much smaller than CSV;
+    # ZSTD gives the best ratio, LZ4 Feather is the fastest to load back
+    buffer = io.BytesIO()
+    if fmt == "Parquet":
+        df.to_parquet(buffer, engine='pyarrow', compression='zstd', index=False)
+    else:
+        df.reset_index(drop=True).to_feather(buffer, compression='lz4')
+    return buffer.getvalue()
+
 # Home page
 if page == "🏠 Home":
     st.markdown("## 🎯 Retail Sales Dataset Analysis")
@@ -118,30 +449,25 @@ if page == "🏠 Home":
         st.subheader("📋 Dataset Overview")
         
         try:
-            # Get basic dataset info
-            dataset_ref = f"{project_id}.assignment_one_1"
-            dataset = client.get_dataset(dataset_ref)
-            
-            # Get table info
-            table_ref = f"{project_id}.assignment_one_1.retail_sales"
-            table = client.get_table(table_ref)
+            # Get table info; a missing dataset surfaces here as NotFound too
+            table = get_table_meta(project_id, "assignment_one_1", "retail_sales")
             
             col1, col2, col3 = st.columns(3)
             
             with col1:
                 st.metric("Dataset", "assignment_one_1")
                 st.metric("Table", "retail_sales")
-                st.metric("Location", table.location)
+                st.metric("Location", table['location'])
             
             with col2:
-                st.metric("Total Rows", f"{table.num_rows:,}")
-                st.metric("Table Size", f"{table.num_bytes / (1024*1024):.2f} MB")
-                st.metric("Created", table.created.strftime("%Y-%m-%d"))
+                st.metric("Total Rows", f"{table['num_rows']:,}")
+                st.metric("Table Size", f"{table['num_bytes'] / (1024*1024):.2f} MB")
+                st.metric("Created", table['created'].strftime("%Y-%m-%d"))
             
             with col3:
                 st.metric("Project ID", project_id)
-                st.metric("Columns", len(table.schema))
-                st.metric("Last Modified", table.modified.strftime("%Y-%m-%d"))
+                st.metric("Columns", len(table['schema']))
+                st.metric("Last Modified", table['modified'].strftime("%Y-%m-%d"))
             
         except Exception as e:
             st.error(f"❌ Error fetching dataset info: {e}")
@@ -182,6 +508,10 @@ if page == "🏠 Home":
 
 # Dataset Analysis page
 elif page == "📊 Dataset Analysis":
+    # Plotly is imported only by the pages that chart, keeping it off
+    # Home, SQL Queries and About
+    px = load_plotly()
+    
     st.header("📊 Comprehensive Dataset Analysis")
     
     client, project_id = get_bigquery_client()
@@ -196,19 +526,15 @@ elif page == "📊 Dataset Analysis":
     st.subheader("🏗️ Table Schema Analysis")
     
     try:
-        table_ref = f"{project_id}.assignment_one_1.retail_sales"
-        table = client.get_table(table_ref)
-        
-        # Display schema
-        schema_df = pd.DataFrame([
-            {
-                'Column': field.name,
-                'Type': field.field_type,
-                'Mode': field.mode,
-                'Description': field.description or 'No description'
-            }
-            for field in table.schema
-        ])
+        schema = get_table_meta(project_id, "assignment_one_1", "retail_sales")['schema']
+        
+        # Display schema, built column-wise rather than one dict per field
+        schema_df = pd.DataFrame({
+            'Column': [field.name for field in schema],
+            'Type': [field.field_type for field in schema],
+            'Mode': [field.mode for field in schema],
+            'Description': [field.description or 'No description' for field in schema]
+        })
         
         st.write("**Table Schema:**")
         st.dataframe(schema_df, use_container_width=True)
@@ -218,7 +544,7 @@ elif page == "📊 Dataset Analysis":
         st.subheader("📋 Data Types Summary")
         
         type_counts = schema_df['Type'].value_counts()
-        fig = px.pie(values=type_counts.values, names=type_counts.index, title="Data Types Distribution")
+        fig = schema_type_chart(tuple(type_counts.index), tuple(type_counts.values.tolist()))
         st.plotly_chart(fig, use_container_width=True)
         
     except Exception as e:
@@ -229,28 +555,34 @@ elif page == "📊 Dataset Analysis":
     st.subheader("🔍 Data Quality Analysis")
     
     try:
-        # Check for null values
+        # Check for null values in a single pass: one COUNTIF per column
+        # instead of unnesting every row into one (column, value) pair each
         null_query = f"""
         SELECT 
-            column_name,
             COUNT(*) as total_rows,
-            COUNTIF(value IS NULL) as null_count,
-            ROUND(COUNTIF(value IS NULL) * 100.0 / COUNT(*), 2) as null_percentage
-        FROM `{project_id}.assignment_one_1.retail_sales`,
-        UNNEST([
-            STRUCT('Date' as column_name, CAST(`Date` AS STRING) as value),
-            STRUCT('Product Category' as column_name, `Product Category` as value),
-            STRUCT('Customer ID' as column_name, CAST(`Customer ID` AS STRING) as value),
-            STRUCT('Quantity' as column_name, CAST(`Quantity` AS STRING) as value),
-            STRUCT('Total Amount' as column_name, CAST(`Total Amount` AS STRING) as value),
-            STRUCT('Gender' as column_name, `Gender` as value),
-            STRUCT('Age' as column_name, CAST(`Age` AS STRING) as value)
-        ])
-        GROUP BY column_name
-        ORDER BY null_percentage DESC
+            COUNTIF(`Date` IS NULL) as date_nulls,
+            COUNTIF(`Product Category` IS NULL) as product_category_nulls,
+            COUNTIF(`Customer ID` IS NULL) as customer_id_nulls,
+            COUNTIF(`Quantity` IS NULL) as quantity_nulls,
+            COUNTIF(`Total Amount` IS NULL) as total_amount_nulls,
+            COUNTIF(`Gender` IS NULL) as gender_nulls,
+            COUNTIF(`Age` IS NULL) as age_nulls
+        FROM `{project_id}.assignment_one_1.retail_sales`
         """
         
-        null_df = client.query(null_query).to_dataframe()
+        null_counts = run_query(null_query, project_id).iloc[0]
+        null_columns = ['Date', 'Product Category', 'Customer ID', 'Quantity', 'Total Amount', 'Gender', 'Age']
+        
+        # Reshape the one-row result into the per-column completeness table
+        null_df = pd.DataFrame({
+            'column_name': null_columns,
+            'total_rows': null_counts['total_rows'],
+            'null_count': [
+                null_counts[f"{column.lower().replace(' ', '_')}_nulls"] for column in null_columns
+            ]
+        })
+        null_df['null_percentage'] = (null_df['null_count'] * 100.0 / null_df['total_rows']).round(2)
+        null_df = null_df.sort_values('null_percentage', ascending=False, ignore_index=True)
         
         col1, col2 = st.columns(2)
         
@@ -274,28 +606,33 @@ elif page == "📊 Dataset Analysis":
     except Exception as e:
         st.error(f"❌ Error analyzing data quality: {e}")
     
-    # Sample Data Display
-    st.markdown("---")
-    st.subheader("📋 Sample Data")
+    # Changing the download format reruns only the sample section
+    @st.fragment
+    def render_sample_data():
+        # Sample Data Display
+        st.markdown("---")
+        st.subheader("📋 Sample Data")
     
-    try:
-        sample_query = f"SELECT * FROM `{project_id}.assignment_one_1.retail_sales` LIMIT 20"
-        sample_df = client.query(sample_query).to_dataframe()
-        
-        st.write("**First 20 Records:**")
-        st.dataframe(sample_df, use_container_width=True)
-        
-        # Download sample data
-        csv = sample_df.to_csv(index=False)
-        st.download_button(
-            label="📥 Download Sample Data as CSV",
-            data=csv,
-            file_name="retail_sales_sample.csv",
-            mime="text/csv"
-        )
+        try:
+            sample_df = fetch_table_rows(f"{project_id}.assignment_one_1.retail_sales", 20)
         
-    except Exception as e:
-        st.error(f"❌ Error fetching sample data: {e}")
+            st.write("**First 20 Records:**")
+            st.dataframe(sample_df, use_container_width=True)
+        
+            # Download sample data
+            sample_fmt = st.radio("Format", list(EXPORT_FORMATS), horizontal=True, key="sample_fmt")
+            ext, mime = EXPORT_FORMATS[sample_fmt]
+            st.download_button(
+                label=f"📥 Download Sample Data as {sample_fmt}",
+                data=export_results(sample_df, sample_fmt),
+                file_name=f"retail_sales_sample.{ext}",
+                mime=mime
+            )
+        
+        except Exception as e:
+            st.error(f"❌ Error fetching sample data: {e}")
+    
+    render_sample_data()
 
 # SQL Queries page
 elif page == "🔍 SQL Queries":
@@ -307,165 +644,213 @@ elif page == "🔍 SQL Queries":
         st.stop()
     
     st.success(f"✅ Connected to BigQuery project: {project_id}")
+    require_clean_tables(project_id)
     
-    # Pre-built Analysis Queries
-    st.markdown("---")
-    st.subheader("📋 Pre-built Analysis Queries")
+    # Template, date and format widgets rerun only this fragment, not the
+    # whole script
+    @st.fragment
+    def render_sql_queries():
+        # Pre-built Analysis Queries
+        st.markdown("---")
+        st.subheader("📋 Pre-built Analysis Queries")
     
-    query_templates = {
-        "Basic Overview": f"""
-        SELECT 
-            COUNT(*) as total_transactions,
-            COUNT(DISTINCT `Customer ID`) as unique_customers,
-            COUNT(DISTINCT `Product Category`) as unique_categories,
-            COUNT(DISTINCT `Transaction ID`) as unique_transactions,
-            ROUND(AVG(CAST(`Total Amount` AS FLOAT64)), 2) as avg_transaction_value,
-            ROUND(SUM(CAST(`Total Amount` AS FLOAT64)), 2) as total_revenue
-        FROM `{project_id}.assignment_one_1.retail_sales`
-        """,
+        # Templates read the typed retail_sales_clean table, which
+        # require_clean_tables keeps in step with retail_sales, so aggregates
+        # run on native columns. The grouped templates re-aggregate its
+        # retail_sales_rollup materialized view, which holds one row per
+        # category/gender/month/age bucket; templates with distinct counts
+        # read retail_sales_clean so the counts stay exact
+        query_templates = {
+            "Basic Overview": f"""
+            SELECT 
+                COUNT(*) as total_transactions,
+                COUNT(DISTINCT `Customer ID`) as unique_customers,
+                COUNT(DISTINCT `Product Category`) as unique_categories,
+                COUNT(DISTINCT `Transaction ID`) as unique_transactions,
+                ROUND(AVG(`Total Amount`), 2) as avg_transaction_value,
+                ROUND(SUM(`Total Amount`), 2) as total_revenue
+            FROM `{project_id}.assignment_one_1.retail_sales_clean`
+            """,
         
-        "Category Performance": f"""
-        SELECT 
-            `Product Category`,
-            COUNT(*) as transaction_count,
-            ROUND(SUM(CAST(`Total Amount` AS FLOAT64)), 2) as total_revenue,
-            ROUND(AVG(CAST(`Total Amount` AS FLOAT64)), 2) as avg_transaction_value,
-            ROUND(SUM(CAST(`Quantity` AS INT64)), 0) as total_quantity_sold
-        FROM `{project_id}.assignment_one_1.retail_sales`
-        WHERE `Product Category` IS NOT NULL
-        GROUP BY `Product Category`
-        ORDER BY total_revenue DESC
-        """,
+            "Category Performance": f"""
+            SELECT 
+                `Product Category`,
+                SUM(transaction_count) as transaction_count,
+                ROUND(SUM(revenue), 2) as total_revenue,
+                ROUND(SAFE_DIVIDE(SUM(revenue), SUM(amount_count)), 2) as avg_transaction_value,
+                SUM(quantity) as total_quantity_sold
+            FROM `{project_id}.assignment_one_1.retail_sales_rollup`
+            WHERE `Product Category` IS NOT NULL
+            GROUP BY `Product Category`
+            ORDER BY total_revenue DESC
+            """,
         
-        "Customer Demographics": f"""
-        SELECT 
-            `Gender`,
-            COUNT(*) as transaction_count,
-            ROUND(SUM(CAST(`Total Amount` AS FLOAT64)), 2) as total_revenue,
-            ROUND(AVG(CAST(`Total Amount` AS FLOAT64)), 2) as avg_transaction_value,
-            COUNT(DISTINCT `Customer ID`) as unique_customers
-        FROM `{project_id}.assignment_one_1.retail_sales`
-        WHERE `Gender` IS NOT NULL
-        GROUP BY `Gender`
-        ORDER BY total_revenue DESC
-        """,
+            "Customer Demographics": f"""
+            SELECT 
+                `Gender`,
+                COUNT(*) as transaction_count,
+                ROUND(SUM(`Total Amount`), 2) as total_revenue,
+                ROUND(AVG(`Total Amount`), 2) as avg_transaction_value,
+                COUNT(DISTINCT `Customer ID`) as unique_customers
+            FROM `{project_id}.assignment_one_1.retail_sales_clean`
+            WHERE `Gender` IS NOT NULL
+            GROUP BY `Gender`
+            ORDER BY total_revenue DESC
+            """,
         
-                "Monthly Trends": f"""
-        SELECT 
-            EXTRACT(YEAR FROM `Date`) as year,
-            EXTRACT(MONTH FROM `Date`) as month,
-            COUNT(*) as transaction_count,
-            ROUND(SUM(CAST(`Total Amount` AS FLOAT64)), 2) as monthly_revenue,
-            ROUND(AVG(CAST(`Total Amount` AS FLOAT64)), 2) as avg_transaction_value
-        FROM `{project_id}.assignment_one_1.retail_sales`
-        WHERE `Date` IS NOT NULL
-        GROUP BY year, month
-        ORDER BY year, month
-        """,
+                    "Monthly Trends": f"""
+            SELECT 
+                EXTRACT(YEAR FROM month_start) as year,
+                EXTRACT(MONTH FROM month_start) as month,
+                SUM(transaction_count) as transaction_count,
+                ROUND(SUM(revenue), 2) as monthly_revenue,
+                ROUND(SAFE_DIVIDE(SUM(revenue), SUM(amount_count)), 2) as avg_transaction_value
+            FROM `{project_id}.assignment_one_1.retail_sales_rollup`
+            WHERE month_start BETWEEN '{{start_date}}' AND '{{end_date}}'
+            GROUP BY year, month
+            ORDER BY year, month
+            """,
         
-                "Customer Analysis": f"""
-        SELECT 
-            `Customer ID`,
-            COUNT(*) as transaction_count,
-            ROUND(SUM(CAST(`Total Amount` AS FLOAT64)), 2) as total_spent,
-            ROUND(AVG(CAST(`Total Amount` AS FLOAT64)), 2) as avg_transaction_value,
-            COUNT(DISTINCT `Product Category`) as categories_purchased,
-            MIN(`Date`) as first_purchase,
-            MAX(`Date`) as last_purchase
-        FROM `{project_id}.assignment_one_1.retail_sales`
-        WHERE `Customer ID` IS NOT NULL
-        GROUP BY `Customer ID`
-        ORDER BY total_spent DESC
-        LIMIT 20
-        """,
+                    "Customer Analysis": f"""
+            SELECT 
+                `Customer ID`,
+                COUNT(*) as transaction_count,
+                ROUND(SUM(`Total Amount`), 2) as total_spent,
+                ROUND(AVG(`Total Amount`), 2) as avg_transaction_value,
+                COUNT(DISTINCT `Product Category`) as categories_purchased,
+                MIN(`Date`) as first_purchase,
+                MAX(`Date`) as last_purchase
+            FROM `{project_id}.assignment_one_1.retail_sales_clean`
+            WHERE `Customer ID` IS NOT NULL
+            GROUP BY `Customer ID`
+            ORDER BY total_spent DESC
+            LIMIT 20
+            """,
         
-        "Age Group Analysis": f"""
-        SELECT 
-            CASE
-                WHEN CAST(`Age` AS INT64) < 18 THEN 'Under 18'
-                WHEN CAST(`Age` AS INT64) BETWEEN 18 AND 25 THEN '18-25'
-                WHEN CAST(`Age` AS INT64) BETWEEN 26 AND 35 THEN '26-35'
-                WHEN CAST(`Age` AS INT64) BETWEEN 36 AND 45 THEN '36-45'
-                WHEN CAST(`Age` AS INT64) BETWEEN 46 AND 55 THEN '46-55'
-                ELSE '55+'
-            END as age_group,
-            COUNT(*) as transaction_count,
-            ROUND(SUM(CAST(`Total Amount` AS FLOAT64)), 2) as total_revenue,
-            ROUND(AVG(CAST(`Total Amount` AS FLOAT64)), 2) as avg_transaction_value
-        FROM `{project_id}.assignment_one_1.retail_sales`
-        WHERE `Age` IS NOT NULL
-        GROUP BY age_group
-        ORDER BY total_revenue DESC
-        """
-    }
+            "Age Group Analysis": f"""
+            SELECT 
+                age_bucket as age_group,
+                SUM(transaction_count) as transaction_count,
+                ROUND(SUM(revenue), 2) as total_revenue,
+                ROUND(SAFE_DIVIDE(SUM(revenue), SUM(amount_count)), 2) as avg_transaction_value
+            FROM `{project_id}.assignment_one_1.retail_sales_rollup`
+            WHERE age_bucket IS NOT NULL
+            GROUP BY age_bucket
+            ORDER BY total_revenue DESC
+            """
+        }
     
-    selected_template = st.selectbox("Choose a pre-built analysis:", list(query_templates.keys()))
-    query = st.text_area("SQL Query:", value=query_templates[selected_template], height=200)
+        selected_template = st.selectbox("Choose a pre-built analysis:", list(query_templates.keys()))
     
-    if st.button("🚀 Execute Query", type="primary"):
-        if query.strip():
-            with st.spinner("Executing query..."):
-                try:
-                    # Execute query
-                    results_df = client.query(query).to_dataframe()
+        # Bound Monthly Trends to a date window so BigQuery only reads those month partitions
+        if selected_template == "Monthly Trends":
+            col1, col2 = st.columns(2)
+            with col1:
+                start_date = st.date_input("From:", value=date(2023, 1, 1))
+            with col2:
+                end_date = st.date_input("To:", value=date.today())
+            query_templates[selected_template] = query_templates[selected_template].format(
+                start_date=start_date.replace(day=1),
+                end_date=end_date
+            )
+    
+        query = st.text_area("SQL Query:", value=query_templates[selected_template], height=200)
+        results_fmt = st.radio("Download format", list(EXPORT_FORMATS), horizontal=True, key="results_fmt")
+    
+        if st.button("🚀 Execute Query", type="primary"):
+            if query.strip():
+                with st.spinner("Executing query..."):
+                    try:
+                        # Execute query
+                        results_df = run_query(query, project_id)
                     
-                    st.success(f"✅ Query executed successfully! Returned {len(results_df)} rows")
+                        st.success(f"✅ Query executed successfully! Returned {len(results_df)} rows")
                     
-                    # Display results
-                    st.write("**Query Results:**")
-                    st.dataframe(results_df, use_container_width=True)
+                        # Display results
+                        st.write("**Query Results:**")
+                        st.dataframe(results_df, use_container_width=True)
                     
-                    # Download results
-                    if len(results_df) > 0:
-                        csv = results_df.to_csv(index=False)
-                        st.download_button(
-                            label="📥 Download Results as CSV",
-                            data=csv,
-                            file_name=f"{selected_template.lower().replace(' ', '_')}_results.csv",
-                            mime="text/csv"
-                        )
+                        # Download results
+                        if len(results_df) > 0:
+                            ext, mime = EXPORT_FORMATS[results_fmt]
+                            st.download_button(
+                                label=f"📥 Download Results as {results_fmt}",
+                                data=export_results(results_df, results_fmt),
+                                file_name=f"{selected_template.lower().replace(' ', '_')}_results.{ext}",
+                                mime=mime
+                            )
                     
-                except Exception as e:
-                    st.error(f"❌ Query execution failed: {e}")
-                    st.info("💡 Check your SQL syntax and table references")
-        else:
-            st.warning("⚠️ Please enter a SQL query")
+                    except Exception as e:
+                        st.error(f"❌ Query execution failed: {e}")
+                        st.info("💡 Check your SQL syntax and table references")
+            else:
+                st.warning("⚠️ Please enter a SQL query")
     
-    # Custom Query Section
-    st.markdown("---")
-    st.subheader("✍️ Custom SQL Query")
+        # Custom Query Section
+        st.markdown("---")
+        st.subheader("✍️ Custom SQL Query")
+    
+        custom_query = st.text_area("Enter your custom SQL query:", height=150, 
+                                   placeholder=f"SELECT `Transaction ID`, `Customer ID`, `Product Category`, `Total Amount` FROM `{project_id}.assignment_one_1.retail_sales` LIMIT 10")
+    
+        custom_fmt = st.radio("Download format", list(EXPORT_FORMATS), horizontal=True, key="custom_fmt")
     
-    custom_query = st.text_area("Enter your custom SQL query:", height=150, 
-                               placeholder=f"SELECT `Transaction ID`, `Customer ID`, `Product Category`, `Total Amount` FROM `{project_id}.assignment_one_1.retail_sales` LIMIT 10")
+        col1, col2 = st.columns(2)
+        with col1:
+            validate_clicked = st.button("✅ Validate Query")
+        with col2:
+            run_clicked = st.button("🔍 Run Custom Query")
     
-    if st.button("🔍 Run Custom Query"):
-        if custom_query.strip():
-            with st.spinner("Executing custom query..."):
+        if validate_clicked:
+            if custom_query.strip():
                 try:
-                    # Execute custom query
-                    custom_results = client.query(custom_query).to_dataframe()
+                    bytes_processed = estimate_query_bytes(custom_query, project_id)
+                    st.success(f"✅ Query is valid. Will scan {bytes_processed / 1e6:.1f} MB")
+                    if bytes_processed > MAX_CUSTOM_QUERY_BYTES:
+                        st.warning("⚠️ This exceeds the 100MB scan limit for custom queries — refine WHERE/LIMIT")
+                except Exception as e:
+                    st.error(f"❌ Query validation failed: {e}")
+                    st.info("💡 Check your SQL syntax and table references")
+            else:
+                st.warning("⚠️ Please enter a custom SQL query")
+    
+        if run_clicked:
+            if custom_query.strip():
+                with st.spinner("Executing custom query..."):
+                    try:
+                        # Execute custom query
+                        # BigQuery rejects the job before billing if it would scan past the cap
+                        custom_results = run_query(custom_query, project_id, MAX_CUSTOM_QUERY_BYTES)
                     
-                    st.success(f"✅ Custom query executed successfully! Returned {len(custom_results)} rows")
+                        st.success(f"✅ Custom query executed successfully! Returned {len(custom_results)} rows")
                     
-                    # Display results
-                    st.write("**Custom Query Results:**")
-                    st.dataframe(custom_results, use_container_width=True)
+                        # Display results
+                        st.write("**Custom Query Results:**")
+                        st.dataframe(custom_results, use_container_width=True)
                     
-                    # Download results
-                    if len(custom_results) > 0:
-                        csv = custom_results.to_csv(index=False)
-                        st.download_button(
-                            label="📥 Download Custom Results as CSV",
-                            data=csv,
-                            file_name="custom_query_results.csv",
-                            mime="text/csv"
-                        )
+                        # Download results
+                        if len(custom_results) > 0:
+                            ext, mime = EXPORT_FORMATS[custom_fmt]
+                            st.download_button(
+                                label=f"📥 Download Custom Results as {custom_fmt}",
+                                data=export_results(custom_results, custom_fmt),
+                                file_name=f"custom_query_results.{ext}",
+                                mime=mime
+                            )
                     
-                except Exception as e:
-                    st.error(f"❌ Custom query execution failed: {e}")
-                    st.info("💡 Check your SQL syntax and table references")
-        else:
-            st.warning("⚠️ Please enter a custom SQL query")
+                    except BadRequest as e:
+                        if any(err.get('reason') == 'bytesBilledLimitExceeded' for err in e.errors):
+                            st.error("❌ Query would exceed 100MB scan limit — refine WHERE/LIMIT")
+                        else:
+                            st.error(f"❌ Custom query execution failed: {e}")
+                            st.info("💡 Check your SQL syntax and table references")
+                    except Exception as e:
+                        st.error(f"❌ Custom query execution failed: {e}")
+                        st.info("💡 Check your SQL syntax and table references")
+            else:
+                st.warning("⚠️ Please enter a custom SQL query")
+    
+    render_sql_queries()
 
 # Visualizations page
 elif page == "📈 Visualizations":
@@ -477,225 +862,45 @@ elif page == "📈 Visualizations":
         st.stop()
     
     st.success(f"✅ Connected to BigQuery project: {project_id}")
+    require_clean_tables(project_id)
     
-    # Visualization Options
-    st.markdown("---")
-    st.subheader("📊 Choose Visualization Type")
-    
-    viz_options = [
-        "Revenue by Category",
-        "Customer Demographics",
-        "Monthly Trends",
-        "Customer Spending",
-        "Age Group Analysis",
-        "Product Performance"
-    ]
-    
-    selected_viz = st.selectbox("Select visualization:", viz_options)
-    
-    if st.button("🎨 Generate Visualization", type="primary"):
-        with st.spinner("Generating visualization..."):
-            try:
-                if selected_viz == "Revenue by Category":
-                    # Category revenue analysis
-                    query = f"""
-                    SELECT 
-                        `Product Category`,
-                        ROUND(SUM(CAST(`Total Amount` AS FLOAT64)), 2) as total_revenue,
-                        COUNT(*) as transaction_count
-                    FROM `{project_id}.assignment_one_1.retail_sales`
-                    WHERE `Product Category` IS NOT NULL
-                    GROUP BY `Product Category`
-                    ORDER BY total_revenue DESC
-                    """
-                    
-                    df = client.query(query).to_dataframe()
-                    
-                    # Create bar chart
-                    fig = px.bar(
-                        df, 
-                        x='Product Category', 
-                        y='total_revenue',
-                        title="Revenue by Product Category",
-                        color='transaction_count',
-                        color_continuous_scale='Viridis'
-                    )
-                    fig.update_layout(xaxis_tickangle=-45)
-                    st.plotly_chart(fig, use_container_width=True)
-                    
-                    # Display data
-                    st.write("**Category Revenue Data:**")
-                    st.dataframe(df, use_container_width=True)
-                
-                elif selected_viz == "Customer Demographics":
-                    # Customer demographics analysis
-                    query = f"""
-                    SELECT 
-                        `Gender`,
-                        ROUND(SUM(CAST(`Total Amount` AS FLOAT64)), 2) as total_revenue,
-                        COUNT(*) as transaction_count,
-                        ROUND(AVG(CAST(`Total Amount` AS FLOAT64)), 2) as avg_transaction_value
-                    FROM `{project_id}.assignment_one_1.retail_sales`
-                    WHERE `Gender` IS NOT NULL
-                    GROUP BY `Gender`
-                    ORDER BY total_revenue DESC
-                    """
-                    
-                    df = client.query(query).to_dataframe()
-                    
-                    # Create pie chart
-                    fig = px.pie(
-                        df,
-                        values='total_revenue',
-                        names='Gender',
-                        title="Revenue Distribution by Gender"
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
-                    
-                    # Display data
-                    st.write("**Customer Demographics Data:**")
-                    st.dataframe(df, use_container_width=True)
-                
-                elif selected_viz == "Monthly Trends":
-                    # Monthly trends analysis
-                                       query = f"""
-                    SELECT 
-                        EXTRACT(YEAR FROM `Date`) as year,
-                        EXTRACT(MONTH FROM `Date`) as month,
-                        ROUND(SUM(CAST(`Total Amount` AS FLOAT64)), 2) as monthly_revenue,
-                        COUNT(*) as transaction_count
-                    FROM `{project_id}.assignment_one_1.retail_sales`
-                    WHERE `Date` IS NOT NULL
-                    GROUP BY year, month
-                    ORDER BY year, month
-                    """
-                    
-                    df = client.query(query).to_dataframe()
-                    
-                    # Create line chart
-                    df['date'] = pd.to_datetime(df[['year', 'month']].assign(day=1))
-                    fig = px.line(
-                        df,
-                        x='date',
-                        y='monthly_revenue',
-                        title="Monthly Revenue Trends",
-                        markers=True
-                    )
-                    fig.update_layout(xaxis_title="Month", yaxis_title="Revenue ($)")
-                    st.plotly_chart(fig, use_container_width=True)
-                    
-                    # Display data
-                    st.write("**Monthly Trends Data:**")
-                    st.dataframe(df, use_container_width=True)
-                 
-                elif selected_viz == "Customer Spending":
-                    # Customer spending analysis
-                    query = f"""
-                    SELECT 
-                        `Customer ID`,
-                        ROUND(SUM(CAST(`Total Amount` AS FLOAT64)), 2) as total_spent,
-                        COUNT(*) as transaction_count,
-                        ROUND(AVG(CAST(`Total Amount` AS FLOAT64)), 2) as avg_transaction_value
-                    FROM `{project_id}.assignment_one_1.retail_sales`
-                    WHERE `Customer ID` IS NOT NULL
-                    GROUP BY `Customer ID`
-                    ORDER BY total_spent DESC
-                    LIMIT 50
-                    """
-                    
-                    df = client.query(query).to_dataframe()
-                    
-                    # Create histogram
-                    fig = px.histogram(
-                        df,
-                        x='total_spent',
-                        nbins=20,
-                        title="Customer Spending Distribution",
-                        labels={'total_spent': 'Total Amount Spent ($)'}
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
-                    
-                    # Display data
-                    st.write("**Customer Spending Data (Top 50):**")
-                    st.dataframe(df, use_container_width=True)
-                
-                elif selected_viz == "Age Group Analysis":
-                    # Age group analysis
-                    query = f"""
-                    SELECT 
-                        CASE
-                            WHEN CAST(`Age` AS INT64) < 18 THEN 'Under 18'
-                            WHEN CAST(`Age` AS INT64) BETWEEN 18 AND 25 THEN '18-25'
-                            WHEN CAST(`Age` AS INT64) BETWEEN 26 AND 35 THEN '26-35'
-                            WHEN CAST(`Age` AS INT64) BETWEEN 36 AND 45 THEN '36-45'
-                            WHEN CAST(`Age` AS INT64) BETWEEN 46 AND 55 THEN '46-55'
-                            ELSE '55+'
-                        END as age_group,
-                        COUNT(*) as transaction_count,
-                        ROUND(SUM(CAST(`Total Amount` AS FLOAT64)), 2) as total_revenue,
-                        ROUND(AVG(CAST(`Total Amount` AS FLOAT64)), 2) as avg_transaction_value
-                    FROM `{project_id}.assignment_one_1.retail_sales`
-                    WHERE `Age` IS NOT NULL
-                    GROUP BY age_group
-                    ORDER BY total_revenue DESC
-                    """
-                    
-                    df = client.query(query).to_dataframe()
-                    
-                    # Create bar chart
-                    fig = px.bar(
-                        df,
-                        x='age_group',
-                        y='total_revenue',
-                        title="Revenue by Age Group",
-                        color='transaction_count',
-                        color_continuous_scale='Viridis'
-                    )
+    # Chart and button interactions rerun only this fragment, not the
+    # client setup or the rest of the script
+    @st.fragment
+    def render_visualizations():
+        # Visualization Options
+        st.markdown("---")
+        st.subheader("📊 Choose Visualization Type")
+        
+        selected_viz = st.selectbox("Select visualization:", list(VISUALIZATIONS))
+        viz_func, data_caption = VISUALIZATIONS[selected_viz]
+        
+        if st.button("🎨 Generate Visualization", type="primary"):
+            st.session_state.last_viz = selected_viz
+        
+        # Keep the last generated chart on screen across reruns; the builders
+        # are cached, so redrawing it doesn't query BigQuery again
+        last_viz = st.session_state.get('last_viz')
+        if last_viz == selected_viz:
+            with st.spinner("Generating visualization..."):
+                try:
+                    fig, df = viz_func(project_id)
                     st.plotly_chart(fig, use_container_width=True)
                     
                     # Display data
-                    st.write("**Age Group Analysis Data:**")
+                    st.write(data_caption)
                     st.dataframe(df, use_container_width=True)
-                
-                elif selected_viz == "Product Performance":
-                    # Product performance analysis
-                    query = f"""
-                    SELECT 
-                        `Product Category`,
-                        COUNT(*) as times_purchased,
-                        ROUND(SUM(CAST(`Total Amount` AS FLOAT64)), 2) as total_revenue,
-                        ROUND(SUM(CAST(`Quantity` AS INT64)), 0) as total_quantity_sold
-                    FROM `{project_id}.assignment_one_1.retail_sales`
-                    WHERE `Product Category` IS NOT NULL
-                    GROUP BY `Product Category`
-                    ORDER BY total_revenue DESC
-                    LIMIT 20
-                    """
-                    
-                    df = client.query(query).to_dataframe()
-                    
-                    # Create horizontal bar chart
-                    fig = px.bar(
-                        df,
-                        y='Product Category',
-                        x='total_revenue',
-                        orientation='h',
-                        title="Top 20 Product Categories by Revenue",
-                        color='times_purchased',
-                        color_continuous_scale='Plasma'
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
                     
-                    # Display data
-                    st.write("**Product Performance Data (Top 20):**")
-                    st.dataframe(df, use_container_width=True)
-                
-            except Exception as e:
-                st.error(f"❌ Error generating visualization: {e}")
-                st.info("💡 This might be due to data type issues or missing columns")
+                except Exception as e:
+                    st.error(f"❌ Error generating visualization: {e}")
+                    st.info("💡 This might be due to data type issues or missing columns")
+    
+    render_visualizations()
 
 # Business Insights page
 elif page == "💡 Business Insights":
+    px = load_plotly()
+    
     st.header("💡 Business Intelligence Insights")
     
     client, project_id = get_bigquery_client()
@@ -704,11 +909,14 @@ elif page == "💡 Business Insights":
         st.stop()
     
     st.success(f"✅ Connected to BigQuery project: {project_id}")
+    require_clean_tables(project_id)
     
     # Key Performance Indicators
     st.markdown("---")
     st.subheader("🎯 Key Performance Indicators (KPIs)")
     
+    # These queries go through run_query, which downloads results over the
+    # BigQuery Storage Read API and caches them across reruns
     try:
         # Calculate KPIs
         kpi_query = f"""
@@ -717,14 +925,14 @@ elif page == "💡 Business Insights":
             COUNT(DISTINCT `Customer ID`) as unique_customers,
             COUNT(DISTINCT `Product Category`) as unique_categories,
             COUNT(DISTINCT `Transaction ID`) as unique_transactions,
-            ROUND(SUM(CAST(`Total Amount` AS FLOAT64)), 2) as total_revenue,
-            ROUND(AVG(CAST(`Total Amount` AS FLOAT64)), 2) as avg_transaction_value,
-            ROUND(SUM(CAST(`Quantity` AS INT64)), 0) as total_items_sold,
-            ROUND(AVG(CAST(`Quantity` AS FLOAT64)), 2) as avg_items_per_transaction
-        FROM `{project_id}.assignment_one_1.retail_sales`
+            ROUND(SUM(`Total Amount`), 2) as total_revenue,
+            ROUND(AVG(`Total Amount`), 2) as avg_transaction_value,
+            SUM(`Quantity`) as total_items_sold,
+            ROUND(AVG(`Quantity`), 2) as avg_items_per_transaction
+        FROM `{project_id}.assignment_one_1.retail_sales_clean`
         """
         
-        kpi_df = client.query(kpi_query).to_dataframe()
+        kpi_df = run_query(kpi_query, project_id)
         
         # Display KPIs in columns
         col1, col2, col3, col4 = st.columns(4)
@@ -757,16 +965,16 @@ elif page == "💡 Business Insights":
         category_query = f"""
         SELECT 
             `Product Category`,
-            ROUND(SUM(CAST(`Total Amount` AS FLOAT64)), 2) as total_revenue,
-            COUNT(*) as transaction_count,
-            ROUND(SUM(CAST(`Total Amount` AS FLOAT64)) * 100.0 / SUM(SUM(CAST(`Total Amount` AS FLOAT64))) OVER(), 2) as revenue_percentage
-        FROM `{project_id}.assignment_one_1.retail_sales`
+            ROUND(SUM(revenue), 2) as total_revenue,
+            SUM(transaction_count) as transaction_count,
+            ROUND(SUM(revenue) * 100.0 / SUM(SUM(revenue)) OVER(), 2) as revenue_percentage
+        FROM `{project_id}.assignment_one_1.retail_sales_rollup`
         WHERE `Product Category` IS NOT NULL
         GROUP BY `Product Category`
         ORDER BY total_revenue DESC
         """
         
-        category_df = client.query(category_query).to_dataframe()
+        category_df = run_query(category_query, project_id)
         
         col1, col2 = st.columns(2)
         
@@ -791,18 +999,18 @@ elif page == "💡 Business Insights":
         store_query = f"""
         SELECT 
             `Product Category`,
-            ROUND(SUM(CAST(`Total Amount` AS FLOAT64)), 2) as total_revenue,
+            ROUND(SUM(`Total Amount`), 2) as total_revenue,
             COUNT(*) as transaction_count,
-            ROUND(AVG(CAST(`Total Amount` AS FLOAT64)), 2) as avg_transaction_value,
+            ROUND(AVG(`Total Amount`), 2) as avg_transaction_value,
             COUNT(DISTINCT `Customer ID`) as unique_customers
-        FROM `{project_id}.assignment_one_1.retail_sales`
+        FROM `{project_id}.assignment_one_1.retail_sales_clean`
         WHERE `Product Category` IS NOT NULL
         GROUP BY `Product Category`
         ORDER BY total_revenue DESC
         LIMIT 10
         """
         
-        store_df = client.query(store_query).to_dataframe()
+        store_df = run_query(store_query, project_id)
         
         col1, col2 = st.columns(2)
         
@@ -840,8 +1048,8 @@ elif page == "💡 Business Insights":
         FROM (
             SELECT 
                 `Customer ID`,
-                SUM(CAST(`Total Amount` AS FLOAT64)) as total_spent
-            FROM `{project_id}.assignment_one_1.retail_sales`
+                SUM(`Total Amount`) as total_spent
+            FROM `{project_id}.assignment_one_1.retail_sales_clean`
             WHERE `Customer ID` IS NOT NULL
             GROUP BY `Customer ID`
         )
@@ -849,7 +1057,7 @@ elif page == "💡 Business Insights":
         ORDER BY total_spent DESC
         """
         
-        customer_df = client.query(customer_query).to_dataframe()
+        customer_df = run_query(customer_query, project_id)
         
         col1, col2 = st.columns(2)
         
@@ -952,7 +1160,7 @@ elif page == "📋 About":
     
     # Footer
     st.markdown("---")
-    st.markdown("*Last updated: " + datetime.now().strftime("%Y-%m-%d %H:%M:%S") + "*")
+    st.markdown("*Last updated: " + st.session_state.page_loaded_at.strftime("%Y-%m-%d %H:%M:%S") + "*")
 
 # Footer for all pages
 st.markdown("---")
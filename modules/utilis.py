@@ -48,6 +48,9 @@ def hash_password(password):
     """Hash password using SHA-256"""
     return hashlib.sha256(password.encode()).hexdigest()
 
+# The default admin password is hashed once at import instead of on every bootstrap
+ADMIN_PASSWORD_HASH = hash_password("admin123")
+
 def verify_password(password, hashed):
     """Verify password against hash"""
     return hash_password(password) == hashed
@@ -73,10 +76,13 @@ def register_user(username, email, password):
             if user_info.get('email') == email:
                 return False, "Email already exists"
         
+        # Hash once; the JSON record and the BigQuery row share the digest
+        password_hash = hash_password(password)
+        
         # Add new user to JSON
         users_data[username] = {
             "email": email,
-            "password": hash_password(password),
+            "password": password_hash,
             "created_at": datetime.now().isoformat(),
             "appointments": []
         }
@@ -89,7 +95,7 @@ def register_user(username, email, password):
         user_data_for_bigquery = {
             'username': username,
             'email': email,
-            'password': hash_password(password),
+            'password': password_hash,
             'role': 'patient'
         }
         
@@ -366,22 +372,15 @@ def ensure_dataset_exists():
             client.get_dataset(dataset_ref)
             return True  # Dataset exists
         except:
-            # Dataset doesn't exist, create it
-            dataset = bigquery.Dataset(dataset_ref)
-            dataset.location = "US"
-            dataset = client.create_dataset(dataset, timeout=30)
-            st.success(f"Created dataset: {dataset_id}")
-            
-            # Create tables after dataset is created
-            create_tables()
-            return True
+            # Dataset doesn't exist, create it together with its tables
+            return create_tables()
             
     except Exception as e:
         st.error(f"Error ensuring dataset exists: {e}")
         return False
 
 def create_tables():
-    """Create the users and appointments tables in BigQuery"""
+    """Create the dataset, the users and appointments tables and the admin user in BigQuery"""
     client, project_id = get_bigquery_client()
     if not client:
         return False
@@ -389,85 +388,59 @@ def create_tables():
     try:
         dataset_id = "assignment_one_1"
         
-        # Create users table
-        users_table_id = f"{project_id}.{dataset_id}.users"
-        users_schema = [
-            bigquery.SchemaField("username", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("email", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("password", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("created_at", "TIMESTAMP", mode="REQUIRED"),
-            bigquery.SchemaField("role", "STRING", mode="REQUIRED")
-        ]
-        
-        users_table = bigquery.Table(users_table_id, schema=users_schema)
-        users_table = client.create_table(users_table, exists_ok=True)
-        
-        # Create appointments table
-        appointments_table_id = f"{project_id}.{dataset_id}.appointments"
-        appointments_schema = [
-            bigquery.SchemaField("username", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("name", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("email", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("specialty", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("date", "DATE", mode="REQUIRED"),
-            bigquery.SchemaField("time", "TIME", mode="REQUIRED"),
-            bigquery.SchemaField("reason", "STRING", mode="NULLABLE"),
-            bigquery.SchemaField("status", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("created_at", "TIMESTAMP", mode="REQUIRED")
-        ]
-        
-        appointments_table = bigquery.Table(appointments_table_id, schema=appointments_schema)
-        appointments_table = client.create_table(appointments_table, exists_ok=True)
-        
-        # Create admin user
-        create_admin_user_auto()
-        
-        return True
-        
-    except Exception as e:
-        st.error(f"Error creating tables: {e}")
-        return False
-
-def create_admin_user_auto():
-    """Create default admin user automatically"""
-    client, project_id = get_bigquery_client()
-    if not client:
-        return False
-    
-    try:
-        # Check if admin user exists
-        query = f"""
-        SELECT username FROM `{project_id}.assignment_one_1.users`
-        WHERE username = 'admin'
-        """
-        
-        result = client.query(query).to_dataframe()
-        
-        if not result.empty:
-            return False  # Admin already exists
-        
-        # Create admin user
-        query = f"""
-        INSERT INTO `{project_id}.assignment_one_1.users`
+        # One multi-statement script instead of separate create_dataset,
+        # create_table and INSERT round-trips. Every statement is idempotent,
+        # so rerunning it against an existing dataset changes nothing
+        setup_script = f"""
+        CREATE SCHEMA IF NOT EXISTS `{project_id}.{dataset_id}`
+        OPTIONS (location = 'US');
+        
+        CREATE TABLE IF NOT EXISTS `{project_id}.{dataset_id}.users` (
+            username STRING NOT NULL,
+            email STRING NOT NULL,
+            password STRING NOT NULL,
+            created_at TIMESTAMP NOT NULL,
+            role STRING NOT NULL
+        );
+        
+        CREATE TABLE IF NOT EXISTS `{project_id}.{dataset_id}.appointments` (
+            username STRING NOT NULL,
+            name STRING NOT NULL,
+            email STRING NOT NULL,
+            specialty STRING NOT NULL,
+            date DATE NOT NULL,
+            time TIME NOT NULL,
+            reason STRING,
+            status STRING NOT NULL,
+            created_at TIMESTAMP NOT NULL
+        );
+        
+        INSERT INTO `{project_id}.{dataset_id}.users`
         (username, email, password, created_at, role)
-        VALUES (@username, @email, @password, @created_at, @role)
+        SELECT @username, @email, @password, @created_at, @role
+        FROM UNNEST([1])
+        WHERE NOT EXISTS (
+            SELECT 1 FROM `{project_id}.{dataset_id}.users`
+            WHERE username = @username
+        );
         """
         
         job_config = bigquery.QueryJobConfig(
             query_parameters=[
                 bigquery.ScalarQueryParameter("username", "STRING", "admin"),
                 bigquery.ScalarQueryParameter("email", "STRING", "admin@medicalcenter.com"),
-                bigquery.ScalarQueryParameter("password", "STRING", hash_password("admin123")),
+                bigquery.ScalarQueryParameter("password", "STRING", ADMIN_PASSWORD_HASH),
                 bigquery.ScalarQueryParameter("created_at", "TIMESTAMP", datetime.now()),
                 bigquery.ScalarQueryParameter("role", "STRING", "admin")
             ]
         )
         
-        client.query(query, job_config=job_config)
+        client.query(setup_script, job_config=job_config, location="US").result()
+        st.success(f"Created dataset: {dataset_id}")
         return True
         
     except Exception as e:
-        st.error(f"Error creating admin user: {e}")
+        st.error(f"Error creating tables: {e}")
         return False
 
 def get_medical_specialists():
@@ -652,33 +625,31 @@ def create_admin_user():
     try:
         # Check if admin user exists
         query = f"""
-        SELECT username FROM `{project_id}.assignment_one_1.users`
+        SELECT 1 FROM `{project_id}.assignment_one_1.users`
         WHERE username = 'admin'
+        LIMIT 1
         """
         
-        result = client.query(query).to_dataframe()
-        
-        if not result.empty:
+        if list(client.query(query).result()):
             return False  # Admin already exists
         
-        # Create admin user
-        query = f"""
-        INSERT INTO `{project_id}.assignment_one_1.users`
-        (username, email, password, created_at, role)
-        VALUES (@username, @email, @password, @created_at, @role)
-        """
-        
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("username", "STRING", "admin"),
-                bigquery.ScalarQueryParameter("email", "STRING", "admin@medicalcenter.com"),
-                bigquery.ScalarQueryParameter("password", "STRING", hash_password("admin123")),
-                bigquery.ScalarQueryParameter("created_at", "TIMESTAMP", datetime.now()),
-                bigquery.ScalarQueryParameter("role", "STRING", "admin")
-            ]
+        # Create admin user with a streaming insert; a single bootstrap row
+        # doesn't need a billed DML job that takes seconds to commit
+        errors = client.insert_rows_json(
+            f"{project_id}.assignment_one_1.users",
+            [{
+                'username': 'admin',
+                'email': 'admin@medicalcenter.com',
+                'password': ADMIN_PASSWORD_HASH,
+                'created_at': datetime.now().isoformat(),
+                'role': 'admin'
+            }]
         )
         
-        client.query(query, job_config=job_config)
+        if errors:
+            st.error(f"Error creating admin user: {errors}")
+            return False
+        
         return True
         
     except Exception as e: